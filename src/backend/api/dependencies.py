@@ -1,15 +1,20 @@
 """
 FastAPI Dependencies for Authentication and Authorization
 """
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from datetime import datetime
+from typing import Optional
+import time
 
 from ..config import settings
 from ..database.mongodb_connection import get_users_collection
+from ..services.user_cache import user_cache
+from ..services.waiting_room import waiting_room
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)  # endpoints that also accept signed links
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
@@ -34,6 +39,11 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
+    # Active users are cached, so hot paths only verify the token
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    
     # Get user from database
     user = await users_collection.find_one({"_id": user_id})
     
@@ -46,6 +56,7 @@ async def get_current_user(
             detail="User account is inactive"
         )
     
+    user_cache.put(user_id, user)
     return user
 
 async def get_current_authority_user(
@@ -87,4 +98,40 @@ async def get_current_user_optional(
     try:
         return await get_current_user(credentials, users_collection)
     except HTTPException:
-        return None
\ No newline at end of file
+        return None
+
+async def require_waiting_room_admission(
+    x_queue_token: Optional[str] = Header(None)
+):
+    """
+    Admit a booking request through the waiting room when it is enabled.
+    
+    The token is used up by a successful booking; a rejected booking
+    leaves it valid for another attempt.
+    """
+    
+    if not settings.WAITING_ROOM_ENABLED:
+        yield
+        return
+    
+    ticket = await waiting_room.admit(x_queue_token)
+    if ticket is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Join the waiting room at /api/bookings/waiting-room and retry once admitted",
+            headers={"Retry-After": "5"}
+        )
+    
+    started = time.monotonic()
+    try:
+        yield ticket
+    except HTTPException as e:
+        await waiting_room.release(ticket)
+        waiting_room.record_result(time.monotonic() - started, e.status_code < 500)
+        raise
+    except Exception:
+        await waiting_room.release(ticket)
+        waiting_room.record_result(time.monotonic() - started, False)
+        raise
+    
+    waiting_room.record_result(time.monotonic() - started, True)
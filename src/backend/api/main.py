@@ -9,7 +9,22 @@ import logging
 from datetime import datetime
 
 from ..config import settings
-from ..database.mongodb_connection import connect_to_mongo, close_mongo_connection
+from ..database.mongodb_connection import (
+    connect_to_mongo,
+    close_mongo_connection,
+    get_crowd_rollups_collection,
+    get_event_logs_collection,
+    get_id_workers_collection
+)
+from ..services.crowd_predictions import prediction_engine
+from ..services.event_log_writer import event_log_writer
+from ..services.id_generator import id_generator
+from .rate_limit import RateLimitMiddleware
+from ..services.password_hashing import password_hasher
+from ..services.qr_codes import qr_image_store, qr_renderer
+from ..services.redis_client import close_redis
+from ..services.user_cache import user_cache
+from ..services.waiting_room import waiting_room
 
 # Import routers
 from .routers import (
@@ -38,12 +53,28 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting Pilgrims Window API...")
     await connect_to_mongo()
+    await id_generator.start(await get_id_workers_collection())
+    event_log_writer.start(await get_event_logs_collection())
+    prediction_engine.start(await get_crowd_rollups_collection())
+    qr_image_store.start()
+    await user_cache.start()
+    if settings.WAITING_ROOM_ENABLED:
+        await waiting_room.start()
     logger.info("API started successfully")
     
     yield
     
     # Shutdown
     logger.info("Shutting down API...")
+    await waiting_room.stop()
+    await prediction_engine.stop()
+    await qr_image_store.stop()
+    await user_cache.stop()
+    await event_log_writer.stop()
+    qr_renderer.shutdown()
+    password_hasher.shutdown()
+    await id_generator.stop()
+    await close_redis()
     await close_mongo_connection()
     logger.info("API shutdown complete")
 
@@ -58,6 +89,9 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Rate limiting, inside CORS so rejected requests still carry CORS headers
+app.add_middleware(RateLimitMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
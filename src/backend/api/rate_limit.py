@@ -0,0 +1,128 @@
+"""
+Rate Limiting Middleware
+Pure ASGI token-bucket limits per user or client IP and route class
+"""
+import json
+import logging
+import math
+import time
+from typing import Dict, Optional
+
+from jose import JWTError, jwt
+
+from ..config import settings
+from ..services.rate_limit import InMemoryRateLimitStore, RedisRateLimitStore
+from ..services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+EXEMPT = "exempt"
+
+# (method or None for any, path prefix, route class); first match wins
+ROUTE_CLASSES = [
+    (None, "/api/emergency", EXEMPT),
+    ("POST", "/api/auth/", "auth"),
+    ("POST", "/api/crowd/", "ingest"),
+    ("PATCH", "/api/transport/shuttle/", "ingest"),
+]
+
+EXEMPT_PATHS = {"/health", "/"}
+
+def class_limits() -> Dict[str, tuple]:
+    return {
+        "default": (settings.RATE_LIMIT_PER_MINUTE, settings.RATE_LIMIT_PER_HOUR),
+        "auth": (settings.RATE_LIMIT_AUTH_PER_MINUTE, settings.RATE_LIMIT_AUTH_PER_HOUR),
+        "ingest": (settings.RATE_LIMIT_INGEST_PER_MINUTE, settings.RATE_LIMIT_INGEST_PER_HOUR),
+    }
+
+class RateLimitMiddleware:
+    """
+    Limits requests per authenticated user, or per client IP when there
+    is no valid token, separately for each route class. Emergency routes
+    and the health check are never limited. If the shared store fails,
+    requests are let through.
+    """
+    
+    def __init__(self, app, store=None, max_tokens_cached: int = 10000):
+        self.app = app
+        self.store = store
+        self.limits = class_limits()
+        self.max_tokens_cached = max_tokens_cached
+        self._subjects: Dict[bytes, Optional[str]] = {}
+    
+    def _route_class(self, method: str, path: str) -> str:
+        if path in EXEMPT_PATHS:
+            return EXEMPT
+        for route_method, prefix, route_class in ROUTE_CLASSES:
+            if path.startswith(prefix) and (route_method is None or route_method == method):
+                return route_class
+        return "default"
+    
+    def _subject(self, token: bytes) -> Optional[str]:
+        # Each token is verified once; later requests only look it up
+        if token in self._subjects:
+            return self._subjects[token]
+        
+        try:
+            subject = jwt.decode(token.decode(), settings.SECRET_KEY, algorithms=[settings.ALGORITHM]).get("sub")
+        except (JWTError, UnicodeDecodeError):
+            subject = None
+        
+        if len(self._subjects) >= self.max_tokens_cached:
+            del self._subjects[next(iter(self._subjects))]
+        self._subjects[token] = subject
+        return subject
+    
+    def _identity(self, scope) -> str:
+        forwarded = None
+        for name, value in scope["headers"]:
+            if name == b"authorization" and value[:7].lower() == b"bearer ":
+                subject = self._subject(value[7:])
+                if subject:
+                    return f"u:{subject}"
+            elif name == b"x-forwarded-for" and settings.RATE_LIMIT_TRUST_FORWARDED:
+                forwarded = value.split(b",")[0].strip().decode()
+        
+        if forwarded:
+            return f"ip:{forwarded}"
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+    
+    async def _get_store(self):
+        if self.store is None:
+            client = await get_redis()
+            self.store = RedisRateLimitStore(client) if client is not None else InMemoryRateLimitStore()
+        return self.store
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.RATE_LIMIT_ENABLED:
+            return await self.app(scope, receive, send)
+        
+        route_class = self._route_class(scope["method"], scope["path"])
+        if route_class == EXEMPT:
+            return await self.app(scope, receive, send)
+        
+        per_minute, per_hour = self.limits[route_class]
+        key = f"{route_class}:{self._identity(scope)}"
+        store = await self._get_store()
+        
+        try:
+            allowed, retry_after = await store.hit(key, per_minute, per_hour, time.time())
+        except Exception as e:
+            logger.error(f"Rate limit store failed, allowing request: {e}")
+            allowed = True
+        
+        if allowed:
+            return await self.app(scope, receive, send)
+        
+        body = json.dumps({"detail": "Rate limit exceeded"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -9,6 +9,7 @@ from datetime import datetime, timedelta
 from ...database.mongodb_schemas import AlertCreate, Alert, AlertInDB, AlertSeverity
 from ...database.mongodb_connection import get_alerts_collection, get_event_logs_collection
 from ...config import settings
+from ...services.id_generator import id_generator
 from ..dependencies import get_current_authority_user, get_current_user_optional
 from ...websocket.websocket_server import notify_alert
 
@@ -32,7 +33,7 @@ async def create_alert(
         )
     
     # Generate alert ID
-    alert_id = f"ALT{int(datetime.utcnow().timestamp() * 1000)}"
+    alert_id = id_generator.next_id("ALT")
     
     # Calculate expiration
     expires_at = None
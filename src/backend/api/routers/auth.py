@@ -4,7 +4,6 @@ Handles user registration, login, and token management
 """
 from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.security import HTTPBearer
-from passlib.context import CryptContext
 from jose import jwt
 from datetime import datetime, timedelta
 from typing import Optional
@@ -12,18 +11,31 @@ from typing import Optional
 from ...database.mongodb_schemas import UserCreate, User, UserInDB, UserRole
 from ...database.mongodb_connection import get_users_collection
 from ...config import settings
+from ...services.password_hashing import password_hasher, PasswordHasherBusy
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+def password_busy_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-ins in progress, please retry shortly",
+        headers={"Retry-After": "2"}
+    )
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify password against hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    try:
+        return await password_hasher.verify(plain_password, hashed_password)
+    except PasswordHasherBusy:
+        raise password_busy_exception()
 
-def get_password_hash(password: str) -> str:
+async def get_password_hash(password: str) -> str:
     """Hash password"""
-    return pwd_context.hash(password)
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise password_busy_exception()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
@@ -63,7 +75,7 @@ async def register(
         )
     
     # Hash password
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash(user.password)
     
     # Create user document
     user_doc = {
@@ -110,7 +122,7 @@ async def login(
         )
     
     # Verify password
-    if not verify_password(password, user["hashed_password"]):
+    if not await verify_password(password, user["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
@@ -2,54 +2,153 @@
 Booking Management API Endpoints
 Handles darshan booking with QR code generation
 """
-from fastapi import APIRouter, HTTPException, Depends, status
+import asyncio
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response, status, BackgroundTasks
 from typing import List, Optional
 from datetime import datetime, timedelta
-import qrcode
-import io
-import base64
 from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
 
 from ...database.mongodb_schemas import (
-    BookingCreate, Booking, BookingInDB, BookingStatus
+    BookingCreate, Booking, BookingInDB, BookingStatus, GateScan, WaitlistStatus
+)
+from ...database.mongodb_connection import (
+    get_bookings_collection,
+    get_booking_slots_collection,
+    get_booking_waitlist_collection,
+    get_event_logs_collection,
+    get_users_collection
 )
-from ...database.mongodb_connection import get_bookings_collection, get_event_logs_collection
 from ...config import settings
-from ..dependencies import get_current_user, get_current_authority_user
+from ...services import booking_waitlist
+from ...services.booking_tokens import (
+    sign_booking_token,
+    verify_booking_token,
+    export_gate_key,
+    sign_qr_image_link,
+    verify_qr_image_link
+)
+from ...services.crowd_rollups import utc_naive
+from ...services.id_generator import id_generator
+from ...services.qr_codes import qr_image_store
+from ...services.slot_counters import (
+    reserve_slot,
+    release_slot,
+    reserve_slots,
+    release_slots,
+    slot_availability,
+    slot_capacity,
+    slot_remaining,
+    day_start
+)
+from ...services.waiting_room import waiting_room
+from ...websocket.websocket_server import notify_booking_update
+from ..dependencies import (
+    get_current_user,
+    get_current_authority_user,
+    optional_security,
+    require_waiting_room_admission
+)
 
 router = APIRouter()
 
-async def generate_qr_code(booking_data: dict) -> tuple[str, str]:
-    """Generate QR code for booking"""
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=settings.QR_CODE_SIZE // 30,
-        border=settings.QR_CODE_BORDER,
+# Rendered QR images never change for a given hash, but belong to one pilgrim
+QR_IMAGE_CACHE_CONTROL = "private, max-age=86400"
+
+# Booking fields left out of API responses
+BOOKING_RESPONSE_PROJECTION = {"qr_code_url": 0}
+
+WAITLIST_FIRST_DETAIL = "Pilgrims are waiting for this time slot; join the waitlist at POST /api/bookings/waitlist"
+
+def check_party_size(booking: BookingCreate):
+    """Reject parties no time slot could ever admit, which would otherwise wait forever"""
+    capacity = slot_capacity(booking.temple_id)
+    if booking.number_of_people > capacity:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A time slot admits at most {capacity} pilgrims"
+        )
+
+async def waitlist_claims_slot(waitlist, slot_counters, bookings_collection,
+                               temple_id: str, booking_date: datetime, time_slot: str) -> bool:
+    """
+    Whether the places left in a slot belong to its waitlist, i.e. some
+    waiting party fits in them. Parties too large for what is left do not
+    hold back direct bookings.
+    """
+    remaining = await slot_remaining(slot_counters, bookings_collection, temple_id, booking_date, time_slot)
+    return remaining > 0 and await booking_waitlist.has_waiting(
+        waitlist, temple_id, booking_date, time_slot, max_people=remaining
     )
+
+def generate_qr_code(booking_data: dict) -> str:
+    """Generate QR code data for booking"""
+    # QR code data is a signed token gate devices verify offline
+    return sign_booking_token(
+        booking_data["booking_id"],
+        booking_data["temple_id"],
+        booking_data["booking_date"],
+        booking_data["time_slot"],
+        booking_data["number_of_people"]
+    )
+
+def qr_image_url(booking_id: str) -> str:
+    """
+    Absolute, signed link to a booking's QR image. Image tags cannot send
+    an Authorization header, so the signature grants access on its own.
+    """
+    link = sign_qr_image_link(booking_id, settings.QR_IMAGE_URL_TTL)
+    return (
+        f"{settings.API_BASE_URL}/api/bookings/{booking_id}/qr"
+        f"?expires={link['expires']}&signature={link['signature']}"
+    )
+
+def booking_document(booking: BookingCreate, booking_id: str, user_id: str, group_id: Optional[str] = None) -> dict:
+    """Build the stored document for a new booking"""
+    booking_data = {
+        "booking_id": booking_id,
+        "temple_id": booking.temple_id,
+        "booking_date": booking.booking_date,
+        "time_slot": booking.time_slot,
+        "number_of_people": booking.number_of_people
+    }
+    qr_code_data = generate_qr_code(booking_data)
     
-    # QR code data format
-    qr_data = f"PW-BOOKING:{booking_data['booking_id']}:{booking_data['temple_id']}:{booking_data['booking_date']}"
-    qr.add_data(qr_data)
-    qr.make(fit=True)
-    
-    # Create image
-    img = qr.make_image(fill_color="black", back_color="white")
-    
-    # Convert to base64
-    buffer = io.BytesIO()
-    img.save(buffer, format='PNG')
-    img_str = base64.b64encode(buffer.getvalue()).decode()
-    qr_code_url = f"data:image/png;base64,{img_str}"
+    # The image is rendered on demand from qr_code_data
+    booking_doc = {
+        **booking.model_dump(),
+        "user_id": user_id,
+        "booking_id": booking_id,
+        "status": BookingStatus.CONFIRMED,
+        "qr_code_data": qr_code_data,
+        "created_at": datetime.utcnow(),
+        "checked_in": False,
+        "checked_in_at": None
+    }
+    if group_id:
+        booking_doc["group_id"] = group_id
     
-    return qr_code_url, qr_data
+    return booking_doc
+
+def booking_response(booking: dict) -> Booking:
+    """Build the API model, pointing qr_code_url at a signed image link"""
+    return Booking(
+        id=str(booking["_id"]),
+        **{k: v for k, v in booking.items() if k not in ("_id", "qr_code_url")},
+        qr_code_url=qr_image_url(booking["booking_id"])
+    )
 
 @router.post("/", response_model=Booking, status_code=status.HTTP_201_CREATED)
 async def create_booking(
     booking: BookingCreate,
+    background_tasks: BackgroundTasks,
     current_user = Depends(get_current_user),
     bookings_collection = Depends(get_bookings_collection),
-    event_logs = Depends(get_event_logs_collection)
+    slot_counters = Depends(get_booking_slots_collection),
+    waitlist = Depends(get_booking_waitlist_collection),
+    event_logs = Depends(get_event_logs_collection),
+    admission = Depends(require_waiting_room_admission)
 ):
     """Create a new darshan booking with QR code"""
     
@@ -60,47 +159,50 @@ async def create_booking(
             detail="Temple not found"
         )
     
-    # Check slot availability
-    existing_bookings = await bookings_collection.count_documents({
-        "temple_id": booking.temple_id,
-        "booking_date": booking.booking_date,
-        "time_slot": booking.time_slot,
-        "status": {"$in": [BookingStatus.CONFIRMED, BookingStatus.PENDING]}
-    })
-    
-    # Maximum 50 bookings per slot (configurable per temple)
-    MAX_BOOKINGS_PER_SLOT = 50
-    if existing_bookings >= MAX_BOOKINGS_PER_SLOT:
+    check_party_size(booking)
+    
+    # Freed places belong to the waitlist first
+    if await waitlist_claims_slot(
+        waitlist, slot_counters, bookings_collection,
+        booking.temple_id, booking.booking_date, booking.time_slot
+    ):
+        # Hand them over in case an interrupted promotion left them free
+        background_tasks.add_task(
+            promote_waitlist, booking.temple_id, booking.booking_date, booking.time_slot,
+            bookings_collection, slot_counters, waitlist, event_logs
+        )
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
-            detail="This time slot is fully booked"
+            detail=WAITLIST_FIRST_DETAIL
         )
     
-    # Generate booking ID
-    booking_id = f"BK{int(datetime.utcnow().timestamp() * 1000)}"
+    # Generate booking ID before reserving, so a failure here cannot strand places
+    booking_id = id_generator.next_id("BK")
     
-    # Generate QR code
-    booking_data = {
-        "booking_id": booking_id,
-        "temple_id": booking.temple_id,
-        "booking_date": booking.booking_date.isoformat()
-    }
-    qr_code_url, qr_code_data = await generate_qr_code(booking_data)
+    # Create booking document with its QR code data
+    booking_doc = booking_document(booking, booking_id, str(current_user["_id"]))
     
-    # Create booking document
-    booking_doc = {
-        **booking.model_dump(),
-        "user_id": str(current_user["_id"]),
-        "booking_id": booking_id,
-        "status": BookingStatus.CONFIRMED,
-        "qr_code_url": qr_code_url,
-        "qr_code_data": qr_code_data,
-        "created_at": datetime.utcnow(),
-        "checked_in": False,
-        "checked_in_at": None
-    }
+    # Reserve places in the slot atomically
+    reserved = await reserve_slot(
+        slot_counters, bookings_collection,
+        booking.temple_id, booking.booking_date, booking.time_slot,
+        booking.zone, booking.number_of_people
+    )
     
-    result = await bookings_collection.insert_one(booking_doc)
+    if not reserved:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="This time slot is fully booked"
+        )
+    
+    try:
+        result = await bookings_collection.insert_one(booking_doc)
+    except Exception:
+        await release_slot(
+            slot_counters, booking.temple_id, booking.booking_date,
+            booking.time_slot, booking.zone, booking.number_of_people
+        )
+        raise
     
     # Log event
     await event_logs.insert_one({
@@ -113,10 +215,291 @@ async def create_booking(
     
     # Return created booking
     created_booking = await bookings_collection.find_one({"_id": result.inserted_id})
-    return Booking(
-        id=str(created_booking["_id"]),
-        **{k: v for k, v in created_booking.items() if k != "_id"}
+    return booking_response(created_booking)
+
+@router.post("/group", response_model=List[Booking], status_code=status.HTTP_201_CREATED)
+async def create_group_booking(
+    bookings: List[BookingCreate],
+    background_tasks: BackgroundTasks,
+    current_user = Depends(get_current_user),
+    bookings_collection = Depends(get_bookings_collection),
+    slot_counters = Depends(get_booking_slots_collection),
+    waitlist = Depends(get_booking_waitlist_collection),
+    event_logs = Depends(get_event_logs_collection),
+    admission = Depends(require_waiting_room_admission)
+):
+    """Create bookings for a family or group; either all succeed or none do"""
+    
+    if not bookings:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No bookings given"
+        )
+    
+    if len(bookings) > settings.BOOKING_GROUP_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.BOOKING_GROUP_MAX_SIZE} bookings per group"
+        )
+    
+    if any(booking.temple_id not in settings.TEMPLES for booking in bookings):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Temple not found"
+        )
+    
+    for booking in bookings:
+        check_party_size(booking)
+    
+    slots = list({(b.temple_id, day_start(b.booking_date), b.time_slot) for b in bookings})
+    claimed = await asyncio.gather(*(
+        waitlist_claims_slot(waitlist, slot_counters, bookings_collection, *slot) for slot in slots
+    ))
+    if any(claimed):
+        for slot, slot_claimed in zip(slots, claimed):
+            if slot_claimed:
+                background_tasks.add_task(
+                    promote_waitlist, *slot, bookings_collection, slot_counters, waitlist, event_logs
+                )
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=WAITLIST_FIRST_DETAIL
+        )
+    
+    # Generate group and booking IDs before reserving, so a failure here cannot strand places
+    group_id = id_generator.next_id("GRP")
+    user_id = str(current_user["_id"])
+    
+    booking_docs = [
+        booking_document(booking, id_generator.next_id("BK"), user_id, group_id)
+        for booking in bookings
+    ]
+    
+    # Reserve places in every slot, or none
+    reservations = [
+        (b.temple_id, b.booking_date, b.time_slot, b.zone, b.number_of_people)
+        for b in bookings
+    ]
+    full = await reserve_slots(slot_counters, bookings_collection, reservations)
+    
+    if full:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Time slot {full[2]} on {full[1].date()} cannot take {full[4]} more pilgrims"
+        )
+    
+    try:
+        await bookings_collection.insert_many(booking_docs)
+    except Exception:
+        # Undo any documents an interrupted insert left behind
+        await bookings_collection.delete_many({"group_id": group_id})
+        await release_slots(slot_counters, reservations)
+        raise
+    
+    # Log event
+    await event_logs.insert_one({
+        "event_type": "booking",
+        "temple_id": bookings[0].temple_id,
+        "message": f"New group booking created: {group_id} with {len(booking_docs)} bookings",
+        "metadata": {
+            "group_id": group_id,
+            "booking_ids": [doc["booking_id"] for doc in booking_docs],
+            "user_id": user_id
+        },
+        "timestamp": datetime.utcnow()
+    })
+    
+    return [booking_response(doc) for doc in booking_docs]
+
+async def promote_waitlist(
+    temple_id: str,
+    booking_date: datetime,
+    time_slot: str,
+    bookings_collection,
+    slot_counters,
+    waitlist,
+    event_logs
+):
+    """
+    Turn waitlist entries for a slot into bookings while places last.
+    
+    Entries are promoted in queue order among the parties that fit: a
+    party larger than the places left keeps its position while later,
+    smaller parties take them, so one large party cannot block the slot.
+    """
+    while True:
+        remaining = await slot_remaining(slot_counters, bookings_collection, temple_id, booking_date, time_slot)
+        if remaining <= 0:
+            return
+        
+        entry = await booking_waitlist.head(waitlist, temple_id, booking_date, time_slot, max_people=remaining)
+        if entry is None:
+            return
+        
+        booking = BookingCreate(**entry["booking"])
+        booking_id = id_generator.next_id("BK")
+        reserved = await reserve_slot(
+            slot_counters, bookings_collection, temple_id, booking_date,
+            time_slot, booking.zone, booking.number_of_people
+        )
+        if not reserved:
+            # A direct booking took places meanwhile; look again at what is left
+            continue
+        
+        if not await booking_waitlist.claim(waitlist, entry, booking_id):
+            # Left the queue or was promoted elsewhere meanwhile
+            await release_slot(slot_counters, temple_id, booking_date, time_slot, booking.zone, booking.number_of_people)
+            continue
+        
+        booking_doc = booking_document(booking, booking_id, entry["user_id"])
+        booking_doc["waitlist_id"] = entry["waitlist_id"]
+        
+        try:
+            await bookings_collection.insert_one(booking_doc)
+        except Exception:
+            await release_slot(slot_counters, temple_id, booking_date, time_slot, booking.zone, booking.number_of_people)
+            await booking_waitlist.unclaim(waitlist, entry)
+            raise
+        
+        await event_logs.insert_one({
+            "event_type": "booking",
+            "temple_id": temple_id,
+            "message": f"Waitlisted booking promoted: {booking_id} from {entry['waitlist_id']}",
+            "metadata": {"booking_id": booking_id, "waitlist_id": entry["waitlist_id"], "user_id": entry["user_id"]},
+            "timestamp": datetime.utcnow()
+        })
+        
+        await notify_booking_update(entry["user_id"], {
+            "event": "waitlist_promoted",
+            "waitlist_id": entry["waitlist_id"],
+            "booking": booking_response(booking_doc).model_dump(mode="json")
+        })
+
+@router.post("/waitlist", status_code=status.HTTP_201_CREATED)
+async def join_waitlist(
+    booking: BookingCreate,
+    background_tasks: BackgroundTasks,
+    current_user = Depends(get_current_user),
+    bookings_collection = Depends(get_bookings_collection),
+    slot_counters = Depends(get_booking_slots_collection),
+    waitlist = Depends(get_booking_waitlist_collection),
+    event_logs = Depends(get_event_logs_collection)
+):
+    """Wait for places in a full slot; the booking is created automatically when they free up"""
+    
+    if booking.temple_id not in settings.TEMPLES:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Temple not found"
+        )
+    
+    check_party_size(booking)
+    
+    # Direct booking is open while no waiting party fits the places left, so then send the pilgrim there
+    remaining = await slot_remaining(
+        slot_counters, bookings_collection, booking.temple_id, booking.booking_date, booking.time_slot
+    )
+    if remaining >= booking.number_of_people and not await booking_waitlist.has_waiting(
+        waitlist, booking.temple_id, booking.booking_date, booking.time_slot, max_people=remaining
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="This time slot has places available; book it directly"
+        )
+    
+    try:
+        entry = await booking_waitlist.enqueue(waitlist, booking.model_dump(), str(current_user["_id"]))
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Already on the waitlist for this time slot"
+        )
+    
+    if remaining:
+        # Places are free but were not handed out, e.g. after an interrupted promotion
+        background_tasks.add_task(
+            promote_waitlist, booking.temple_id, booking.booking_date, booking.time_slot,
+            bookings_collection, slot_counters, waitlist, event_logs
+        )
+    
+    return {
+        "waitlist_id": entry["waitlist_id"],
+        "status": entry["status"],
+        "position": await booking_waitlist.position(waitlist, entry)
+    }
+
+@router.get("/waitlist/mine")
+async def get_my_waitlist(
+    current_user = Depends(get_current_user),
+    waitlist = Depends(get_booking_waitlist_collection)
+):
+    """Get current user's waitlist entries with queue positions"""
+    
+    cursor = waitlist.find(
+        {"user_id": str(current_user["_id"])},
+        projection={"_id": 0, "booking": 0}
+    ).sort("created_at", -1).limit(50)
+    entries = await cursor.to_list(length=50)
+    
+    for entry in entries:
+        if entry["status"] == WaitlistStatus.WAITING:
+            entry["position"] = await booking_waitlist.position(waitlist, entry)
+    
+    return entries
+
+@router.delete("/waitlist/{waitlist_id}")
+async def leave_waitlist(
+    waitlist_id: str,
+    current_user = Depends(get_current_user),
+    waitlist = Depends(get_booking_waitlist_collection)
+):
+    """Leave a slot's waitlist"""
+    
+    result = await waitlist.update_one(
+        {"waitlist_id": waitlist_id, "user_id": str(current_user["_id"]), "status": WaitlistStatus.WAITING},
+        {"$set": {"status": WaitlistStatus.CANCELLED}}
     )
+    
+    if not result.modified_count:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No waiting entry with this ID"
+        )
+    
+    return {"message": "Left the waitlist"}
+
+@router.post("/waiting-room")
+async def join_waiting_room():
+    """Join the booking queue; the token goes in the X-Queue-Token header once admitted"""
+    
+    if not settings.WAITING_ROOM_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Waiting room is not active"
+        )
+    
+    return await waiting_room.join()
+
+@router.get("/waiting-room/metrics")
+async def get_waiting_room_metrics(
+    current_user = Depends(get_current_authority_user)
+):
+    """Get waiting room queue depth and admission rate (Authority only)"""
+    return {"enabled": settings.WAITING_ROOM_ENABLED, **await waiting_room.metrics()}
+
+@router.get("/waiting-room/{token}")
+async def get_waiting_room_position(token: str):
+    """Get queue position and estimated wait for a waiting room token"""
+    
+    position = await waiting_room.status(token)
+    
+    if position is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Unknown waiting room token"
+        )
+    
+    return position
 
 @router.get("/my-bookings", response_model=List[Booking])
 async def get_my_bookings(
@@ -132,13 +515,12 @@ async def get_my_bookings(
     if status_filter:
         query["status"] = status_filter
     
-    cursor = bookings_collection.find(query).sort("created_at", -1).skip(skip).limit(limit)
+    cursor = bookings_collection.find(
+        query, projection=BOOKING_RESPONSE_PROJECTION
+    ).sort("created_at", -1).skip(skip).limit(limit)
     bookings = await cursor.to_list(length=limit)
     
-    return [
-        Booking(id=str(b["_id"]), **{k: v for k, v in b.items() if k != "_id"})
-        for b in bookings
-    ]
+    return [booking_response(b) for b in bookings]
 
 @router.get("/{booking_id}", response_model=Booking)
 async def get_booking(
@@ -148,7 +530,9 @@ async def get_booking(
 ):
     """Get specific booking by ID"""
     
-    booking = await bookings_collection.find_one({"booking_id": booking_id})
+    booking = await bookings_collection.find_one(
+        {"booking_id": booking_id}, projection=BOOKING_RESPONSE_PROJECTION
+    )
     
     if not booking:
         raise HTTPException(
@@ -163,16 +547,65 @@ async def get_booking(
             detail="Not authorized to view this booking"
         )
     
-    return Booking(
-        id=str(booking["_id"]),
-        **{k: v for k, v in booking.items() if k != "_id"}
+    return booking_response(booking)
+
+@router.get("/{booking_id}/qr")
+async def get_booking_qr(
+    booking_id: str,
+    expires: Optional[int] = None,
+    signature: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    credentials = Depends(optional_security),
+    users_collection = Depends(get_users_collection),
+    bookings_collection = Depends(get_bookings_collection)
+):
+    """Get the QR code image for a booking, via its signed link or with a bearer token"""
+    
+    signed = expires is not None and signature is not None and verify_qr_image_link(booking_id, expires, signature)
+    current_user = None
+    if not signed:
+        if credentials is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="QR image link is invalid or has expired",
+                headers={"WWW-Authenticate": "Bearer"}
+            )
+        current_user = await get_current_user(credentials, users_collection)
+    
+    booking = await bookings_collection.find_one(
+        {"booking_id": booking_id},
+        projection={"user_id": 1, "qr_code_data": 1}
     )
+    
+    if not booking:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Booking not found"
+        )
+    
+    if current_user is not None and booking["user_id"] != str(current_user["_id"]) and current_user.get("role") != "authority":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to view this booking"
+        )
+    
+    etag = f'"{qr_image_store.digest(booking["qr_code_data"])}"'
+    headers = {"ETag": etag, "Cache-Control": QR_IMAGE_CACHE_CONTROL}
+    
+    if if_none_match == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    png = await qr_image_store.get_png(booking["qr_code_data"])
+    return Response(content=png, media_type="image/png", headers=headers)
 
 @router.patch("/{booking_id}/cancel")
 async def cancel_booking(
     booking_id: str,
+    background_tasks: BackgroundTasks,
     current_user = Depends(get_current_user),
     bookings_collection = Depends(get_bookings_collection),
+    slot_counters = Depends(get_booking_slots_collection),
+    waitlist = Depends(get_booking_waitlist_collection),
     event_logs = Depends(get_event_logs_collection)
 ):
     """Cancel a booking"""
@@ -197,12 +630,40 @@ async def cancel_booking(
             detail="Booking already cancelled"
         )
     
-    # Update booking status
-    await bookings_collection.update_one(
-        {"_id": booking["_id"]},
+    if booking["status"] == BookingStatus.COMPLETED or booking.get("checked_in"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Checked-in bookings cannot be cancelled"
+        )
+    
+    # Update booking status; only the request that cancels it releases its places
+    result = await bookings_collection.update_one(
+        {
+            "_id": booking["_id"],
+            "status": {"$in": [BookingStatus.CONFIRMED, BookingStatus.PENDING]},
+            "checked_in": {"$ne": True}
+        },
         {"$set": {"status": BookingStatus.CANCELLED}}
     )
     
+    if not result.modified_count:
+        # Checked in or cancelled by another request meanwhile
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Booking can no longer be cancelled"
+        )
+    
+    await release_slot(
+        slot_counters, booking["temple_id"], booking["booking_date"],
+        booking["time_slot"], booking["zone"], booking.get("number_of_people", 1)
+    )
+    
+    # Hand the freed places to the slot's waitlist
+    background_tasks.add_task(
+        promote_waitlist, booking["temple_id"], booking["booking_date"], booking["time_slot"],
+        bookings_collection, slot_counters, waitlist, event_logs
+    )
+    
     # Log event
     await event_logs.insert_one({
         "event_type": "booking",
@@ -243,9 +704,9 @@ async def checkin_booking(
             detail="Already checked in"
         )
     
-    # Update check-in status
-    await bookings_collection.update_one(
-        {"_id": booking["_id"]},
+    # Update check-in status unless the booking was cancelled or checked in meanwhile
+    result = await bookings_collection.update_one(
+        {"_id": booking["_id"], "status": BookingStatus.CONFIRMED, "checked_in": False},
         {
             "$set": {
                 "checked_in": True,
@@ -255,6 +716,12 @@ async def checkin_booking(
         }
     )
     
+    if not result.modified_count:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Booking was cancelled or checked in meanwhile"
+        )
+    
     # Log event
     await event_logs.insert_one({
         "event_type": "booking",
@@ -266,11 +733,131 @@ async def checkin_booking(
     
     return {"message": "Check-in successful"}
 
+@router.post("/checkin/batch")
+async def batch_checkin(
+    scans: List[GateScan],
+    current_user = Depends(get_current_authority_user),
+    bookings_collection = Depends(get_bookings_collection),
+    event_logs = Depends(get_event_logs_collection)
+):
+    """
+    Apply gate scans collected offline (Authority only)
+    
+    Safe to resend: the earliest scan of a booking wins, and a scan that
+    already won reports checked_in again.
+    """
+    
+    if len(scans) > settings.CHECKIN_BATCH_MAX_SCANS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.CHECKIN_BATCH_MAX_SCANS} scans per request"
+        )
+    
+    results = [None] * len(scans)
+    earliest = {}  # booking_id -> (scanned_at, index)
+    
+    for i, scan in enumerate(scans):
+        claims = verify_booking_token(scan.token)
+        if claims is None:
+            results[i] = {"index": i, "status": "invalid_token"}
+            continue
+        
+        # MongoDB keeps millisecond precision
+        scanned_at = utc_naive(scan.scanned_at)
+        scanned_at = scanned_at.replace(microsecond=scanned_at.microsecond // 1000 * 1000)
+        
+        booking_id = claims["booking_id"]
+        if booking_id in earliest and earliest[booking_id][0] <= scanned_at:
+            results[i] = {"index": i, "booking_id": booking_id, "status": "duplicate"}
+            continue
+        if booking_id in earliest:
+            previous = earliest[booking_id][1]
+            results[previous] = {"index": previous, "booking_id": booking_id, "status": "duplicate"}
+        earliest[booking_id] = (scanned_at, i)
+    
+    if earliest:
+        # An earlier scan replaces a later one that synced first
+        await bookings_collection.bulk_write([
+            UpdateOne(
+                {
+                    "booking_id": booking_id,
+                    "$or": [
+                        {"status": BookingStatus.CONFIRMED, "checked_in": False},
+                        {"status": BookingStatus.COMPLETED, "checked_in": True, "checked_in_at": {"$gt": scanned_at}}
+                    ]
+                },
+                {"$set": {
+                    "checked_in": True,
+                    "checked_in_at": scanned_at,
+                    "checked_in_gate": scans[i].gate_id,
+                    "status": BookingStatus.COMPLETED
+                }}
+            )
+            for booking_id, (scanned_at, i) in earliest.items()
+        ], ordered=False)
+        
+        cursor = bookings_collection.find(
+            {"booking_id": {"$in": list(earliest)}},
+            projection={"_id": 0, "booking_id": 1, "status": 1, "checked_in_at": 1, "checked_in_gate": 1}
+        )
+        stored = {b["booking_id"]: b async for b in cursor}
+        
+        for booking_id, (scanned_at, i) in earliest.items():
+            booking = stored.get(booking_id)
+            result = {"index": i, "booking_id": booking_id}
+            
+            if booking is None:
+                result["status"] = "not_found"
+            elif booking["status"] != BookingStatus.COMPLETED:
+                result.update({"status": "not_confirmed", "booking_status": booking["status"]})
+            elif booking.get("checked_in_at") == scanned_at and booking.get("checked_in_gate") == scans[i].gate_id:
+                result["status"] = "checked_in"
+            else:
+                # Another scan got there first
+                result.update({
+                    "status": "conflict",
+                    "checked_in_at": booking["checked_in_at"],
+                    "checked_in_gate": booking.get("checked_in_gate")
+                })
+            
+            results[i] = result
+    
+    checked_in = sum(1 for r in results if r["status"] == "checked_in")
+    
+    await event_logs.insert_one({
+        "event_type": "booking",
+        "message": f"Gate check-in sync: {checked_in} of {len(scans)} scans applied",
+        "metadata": {"scans": len(scans), "checked_in": checked_in, "user_id": str(current_user["_id"])},
+        "timestamp": datetime.utcnow()
+    })
+    
+    return {"checked_in": checked_in, "results": results}
+
+@router.get("/temple/{temple_id}/gate-key")
+async def get_gate_key(
+    temple_id: str,
+    current_user = Depends(get_current_authority_user)
+):
+    """Get the key gate devices use to verify booking QR tokens offline (Authority only)"""
+    
+    if temple_id not in settings.TEMPLES:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Temple not found"
+        )
+    
+    return {
+        "temple_id": temple_id,
+        "algorithm": "HMAC-SHA256/128",
+        "key": export_gate_key(temple_id)
+    }
+
 @router.get("/temple/{temple_id}/slots")
 async def get_available_slots(
     temple_id: str,
     date: datetime,
-    bookings_collection = Depends(get_bookings_collection)
+    bookings_collection = Depends(get_bookings_collection),
+    slot_counters = Depends(get_booking_slots_collection)
 ):
     """Get available time slots for a temple on a specific date"""
     
@@ -280,30 +867,26 @@ async def get_available_slots(
             detail="Temple not found"
         )
     
-    # Define time slots
-    time_slots = [
-        "06:00-08:00", "08:00-10:00", "10:00-12:00",
-        "12:00-14:00", "14:00-16:00", "16:00-18:00",
-        "18:00-20:00", "20:00-22:00"
-    ]
-    
-    # Check availability for each slot
-    MAX_BOOKINGS_PER_SLOT = 50
-    available_slots = []
+    calendar = await slot_availability(slot_counters, bookings_collection, temple_id, date)
+    return calendar[0]["slots"]
+
+@router.get("/temple/{temple_id}/calendar")
+async def get_availability_calendar(
+    temple_id: str,
+    start_date: datetime,
+    days: int = Query(30, ge=1, le=settings.BOOKING_CALENDAR_MAX_DAYS),
+    bookings_collection = Depends(get_bookings_collection),
+    slot_counters = Depends(get_booking_slots_collection)
+):
+    """Get slot availability for a temple over a range of days"""
     
-    for slot in time_slots:
-        bookings_count = await bookings_collection.count_documents({
-            "temple_id": temple_id,
-            "booking_date": date,
-            "time_slot": slot,
-            "status": {"$in": [BookingStatus.CONFIRMED, BookingStatus.PENDING]}
-        })
-        
-        available_slots.append({
-            "time_slot": slot,
-            "available": bookings_count < MAX_BOOKINGS_PER_SLOT,
-            "booked": bookings_count,
-            "capacity": MAX_BOOKINGS_PER_SLOT
-        })
+    if temple_id not in settings.TEMPLES:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Temple not found"
+        )
     
-    return available_slots
\ No newline at end of file
+    return {
+        "temple_id": temple_id,
+        "days": await slot_availability(slot_counters, bookings_collection, temple_id, start_date, days)
+    }
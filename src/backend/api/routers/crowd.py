@@ -2,13 +2,48 @@
 Crowd Monitoring API Endpoints
 Handles real-time crowd density data and analytics
 """
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response, status, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
 from ...database.mongodb_schemas import CrowdDataPoint, ZoneCrowdData, CrowdStatus
-from ...database.mongodb_connection import get_crowd_data_collection, get_event_logs_collection
+from ...database.mongodb_connection import (
+    get_crowd_data_collection,
+    get_crowd_latest_collection,
+    get_crowd_rollups_collection
+)
 from ...config import settings
+from ...services.crowd_cache import crowd_cache
+from ...services.crowd_events import crowd_event_bus
+from ...services.crowd_rollups import (
+    ROLLUP_RESOLUTIONS,
+    bucket_start,
+    build_rollup_updates,
+    rollups_to_heatmap,
+    select_history_resolution,
+    utc_naive
+)
+from ...services.crowd_predictions import prediction_engine
+from ...services.crowd_forecast import crowd_forecaster
+from ...services.crowd_stats import crowd_ring_buffer
+from ...services.crowd_classifier import crowd_classifier
+from ...services.crowd_log_coalescer import crowd_log_coalescer
+from ...services.crowd_anomaly import crowd_anomaly_detector
+from ...services.event_log_writer import event_log_writer
+from ...websocket.websocket_server import notify_crowd_anomaly
+from ...services.crowd_zones import ZONE_SETS
+from ...services.crowd_history import (
+    downsample_history,
+    iter_ndjson,
+    iter_raw_history,
+    iter_raw_zone_history,
+    iter_rollup_history,
+    iter_rollup_zone_history,
+    raw_zone_projection
+)
 from ..dependencies import get_current_user, get_current_authority_user
 
 router = APIRouter()
@@ -16,7 +51,10 @@ router = APIRouter()
 @router.get("/temple/{temple_id}/current")
 async def get_current_crowd_data(
     temple_id: str,
-    crowd_collection = Depends(get_crowd_data_collection)
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    crowd_collection = Depends(get_crowd_data_collection),
+    latest_collection = Depends(get_crowd_latest_collection)
 ):
     """Get current crowd data for a temple"""
     
@@ -26,11 +64,18 @@ async def get_current_crowd_data(
             detail="Temple not found"
         )
     
-    # Get latest crowd data
-    crowd_data = await crowd_collection.find_one(
-        {"temple_id": temple_id},
-        sort=[("timestamp", -1)]
-    )
+    # Get latest crowd data from the snapshot cache
+    snapshot = await crowd_cache.get(temple_id, latest_collection, crowd_collection)
+    
+    if if_none_match == snapshot.etag:
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={"ETag": snapshot.etag}
+        )
+    
+    response.headers["ETag"] = snapshot.etag
+    response.headers["Cache-Control"] = "no-cache"
+    crowd_data = snapshot.data
     
     if not crowd_data:
         # Return default data if no data exists
@@ -62,9 +107,20 @@ async def get_crowd_history(
     temple_id: str,
     hours: int = 24,
     zone: Optional[str] = None,
-    crowd_collection = Depends(get_crowd_data_collection)
+    stream: bool = False,
+    max_points: Optional[int] = Query(None, ge=3),
+    resolution: str = Query("auto", pattern="^(raw|auto|1m|5m|1h|1d)$"),
+    crowd_collection = Depends(get_crowd_data_collection),
+    crowd_rollups = Depends(get_crowd_rollups_collection)
 ):
-    """Get historical crowd data for a temple"""
+    """
+    Get historical crowd data for a temple, optionally as an NDJSON stream.
+    
+    `resolution` selects raw readings, a rollup tier, or "auto" (the default)
+    for raw readings when the window fits raw retention and the point budget,
+    otherwise the finest rollup tier that does. Explicit raw requests on
+    buffered responses are capped at the point budget.
+    """
     
     if temple_id not in settings.TEMPLES:
         raise HTTPException(
@@ -75,37 +131,136 @@ async def get_crowd_history(
     # Calculate time range
     start_time = datetime.utcnow() - timedelta(hours=hours)
     
-    # Query crowd data
-    query = {
-        "temple_id": temple_id,
-        "timestamp": {"$gte": start_time}
-    }
+    # Streamed and downsampled responses are not buffered, so they can read far more points
+    buffered = not stream and max_points is None
+    point_budget = settings.CROWD_HISTORY_POINT_BUDGET if buffered else settings.CROWD_HISTORY_STREAM_POINT_BUDGET
+    
+    if resolution == "auto":
+        # Serve long windows from the finest rollup tier that fits the point budget
+        resolution = select_history_resolution(hours, point_budget) or "raw"
+    
+    if resolution != "raw":
+        query = {
+            "temple_id": temple_id,
+            "resolution": resolution,
+            "bucket_start": {"$gte": bucket_start(start_time, ROLLUP_RESOLUTIONS[resolution])}
+        }
+        if zone:
+            query["zone_id"] = zone
+        
+        cursor = crowd_rollups.find(query, projection={"_id": 0}).sort([("bucket_start", 1), ("zone_id", 1)])
+        
+        if zone:
+            records = iter_rollup_zone_history(cursor)
+        else:
+            records = iter_rollup_history(cursor, temple_id, resolution)
+    else:
+        # Query crowd data
+        query = {
+            "temple_id": temple_id,
+            "timestamp": {"$gte": start_time}
+        }
+        projection = {"_id": 0}
+        
+        # Filter by zone in the database so only that zone's element is transferred
+        if zone:
+            query["zones.zone_id"] = zone
+            projection = raw_zone_projection(zone)
+        
+        cursor = crowd_collection.find(query, projection=projection).sort("timestamp", 1)
+        if buffered:
+            cursor = cursor.limit(settings.CROWD_HISTORY_POINT_BUDGET)
+        
+        if zone:
+            records = iter_raw_zone_history(cursor)
+        else:
+            records = iter_raw_history(cursor)
+    
+    if max_points is not None:
+        records = downsample_history(records, max_points)
+    
+    if stream:
+        return StreamingResponse(iter_ndjson(records), media_type="application/x-ndjson")
+    
+    return [record async for record in records]
+
+def _invalid_zones_message(temple_id: str) -> str:
+    return f"Invalid zones. Valid zones for {temple_id}: {', '.join(settings.TEMPLES[temple_id]['zones'])}"
+
+async def _publish_crowd_docs(crowd_docs: List[dict], latest_collection, rollups_collection) -> List[dict]:
+    """
+    Propagate stored crowd readings to rollups, snapshots, in-memory
+    analytics and the event log. Returns any anomalies detected.
+    """
+    
+    # Fold the readings into the per-zone rollups in one round trip
+    rollup_updates = [update for doc in crowd_docs for update in build_rollup_updates(doc)]
+    if rollup_updates:
+        await rollups_collection.bulk_write(rollup_updates, ordered=False)
+    
+    # Write through the newest reading per temple so readers never query history
+    newest = {}
+    for doc in crowd_docs:
+        if doc["temple_id"] not in newest or doc["timestamp"] > newest[doc["temple_id"]]["timestamp"]:
+            newest[doc["temple_id"]] = doc
+    
+    for temple_id, doc in newest.items():
+        snapshot = {k: v for k, v in doc.items() if k != "_id"}
+        try:
+            latest = await latest_collection.find_one_and_update(
+                {"_id": temple_id, "snapshot.timestamp": {"$lt": doc["timestamp"]}},
+                {"$set": {"snapshot": snapshot}, "$inc": {"version": 1}},
+                projection={"version": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            crowd_cache.put(temple_id, snapshot, latest["version"])
+            crowd_event_bus.publish(temple_id, snapshot, latest["version"])
+        except DuplicateKeyError:
+            # A newer snapshot is already stored (e.g. a gateway replaying backlog)
+            pass
+    
+    # Advance the in-memory analytics in time order and queue coalesced event logs
+    anomalies = []
+    for doc in sorted(crowd_docs, key=lambda d: d["timestamp"]):
+        crowd_forecaster.update(doc["temple_id"], doc["zones"], doc["timestamp"])
+        crowd_ring_buffer.append(doc["temple_id"], doc["zones"], doc["timestamp"])
+        
+        for event in crowd_log_coalescer.observe(doc):
+            event_log_writer.enqueue(event)
+        
+        for anomaly in crowd_anomaly_detector.observe(doc):
+            anomalies.append(anomaly)
+            event_log_writer.enqueue({
+                "event_type": "crowd_anomaly",
+                "temple_id": anomaly["temple_id"],
+                "message": (
+                    f"Anomaly in {anomaly['zone_name']}: density {anomaly['density']:.1f}% "
+                    f"(z={anomaly['density_z']:.1f}, flow z={anomaly['flow_z']:.1f})"
+                ),
+                "metadata": {k: v for k, v in anomaly.items() if k not in ("temple_id", "timestamp")},
+                "timestamp": anomaly["timestamp"]
+            })
     
-    cursor = crowd_collection.find(query).sort("timestamp", 1)
-    history = await cursor.to_list(length=1000)
-    
-    # Filter by zone if specified
-    if zone:
-        filtered_history = []
-        for record in history:
-            zones_data = record.get("zones", [])
-            zone_data = next((z for z in zones_data if z["zone_id"] == zone), None)
-            if zone_data:
-                filtered_history.append({
-                    "timestamp": record["timestamp"],
-                    "zone_data": zone_data
-                })
-        return filtered_history
-    
-    return history
+    return anomalies
+
+def _push_anomalies(anomalies: List[dict], background_tasks: BackgroundTasks):
+    """Push anomalies to WebSocket subscribers once the response is sent"""
+    for anomaly in anomalies:
+        background_tasks.add_task(notify_crowd_anomaly, {
+            **anomaly,
+            "timestamp": anomaly["timestamp"].isoformat()
+        })
 
 @router.post("/temple/{temple_id}/update", status_code=status.HTTP_201_CREATED)
 async def update_crowd_data(
     temple_id: str,
     crowd_data: CrowdDataPoint,
+    background_tasks: BackgroundTasks,
     current_user = Depends(get_current_authority_user),
     crowd_collection = Depends(get_crowd_data_collection),
-    event_logs = Depends(get_event_logs_collection)
+    latest_collection = Depends(get_crowd_latest_collection),
+    rollups_collection = Depends(get_crowd_rollups_collection)
 ):
     """Update crowd data for a temple (Authority only)"""
     
@@ -116,42 +271,103 @@ async def update_crowd_data(
         )
     
     # Validate zones
-    temple_info = settings.TEMPLES[temple_id]
-    valid_zones = set(temple_info["zones"])
-    provided_zones = {zone.zone_id for zone in crowd_data.zones}
-    
-    if not provided_zones.issubset(valid_zones):
+    if not {zone.zone_id for zone in crowd_data.zones} <= ZONE_SETS[temple_id]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid zones. Valid zones for {temple_id}: {', '.join(valid_zones)}"
+            detail=_invalid_zones_message(temple_id)
         )
     
-    # Insert crowd data
+    # Insert crowd data with server-derived density, status and wait time
     crowd_doc = {
         **crowd_data.model_dump(),
+        "temple_id": temple_id,
         "timestamp": datetime.utcnow()
     }
+    crowd_classifier.apply(crowd_doc)
     
     await crowd_collection.insert_one(crowd_doc)
-    
-    # Log high density zones
-    for zone in crowd_data.zones:
-        if zone.status in [CrowdStatus.HIGH, CrowdStatus.CRITICAL]:
-            await event_logs.insert_one({
-                "event_type": "crowd_update",
-                "temple_id": temple_id,
-                "message": f"{zone.zone_name} at {zone.status} density: {zone.density:.1f}%",
-                "metadata": {"zone": zone.zone_id, "density": zone.density},
-                "timestamp": datetime.utcnow()
-            })
+    anomalies = await _publish_crowd_docs([crowd_doc], latest_collection, rollups_collection)
+    _push_anomalies(anomalies, background_tasks)
     
     return {"message": "Crowd data updated successfully"}
 
+@router.post("/bulk")
+async def bulk_update_crowd_data(
+    readings: List[CrowdDataPoint],
+    background_tasks: BackgroundTasks,
+    current_user = Depends(get_current_authority_user),
+    crowd_collection = Depends(get_crowd_data_collection),
+    latest_collection = Depends(get_crowd_latest_collection),
+    rollups_collection = Depends(get_crowd_rollups_collection)
+):
+    """Ingest a batch of crowd readings across temples and timestamps (Authority only)"""
+    
+    if len(readings) > settings.CROWD_BULK_MAX_READINGS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.CROWD_BULK_MAX_READINGS} readings per request"
+        )
+    
+    results = [{"index": i, "status": "created"} for i in range(len(readings))]
+    latest_allowed = datetime.utcnow() + timedelta(seconds=settings.CROWD_BULK_MAX_CLOCK_SKEW)
+    crowd_docs = []
+    doc_indexes = []
+    
+    for i, reading in enumerate(readings):
+        if reading.temple_id not in ZONE_SETS:
+            results[i] = {"index": i, "status": "rejected", "detail": "Temple not found"}
+            continue
+        
+        if not {zone.zone_id for zone in reading.zones} <= ZONE_SETS[reading.temple_id]:
+            results[i] = {"index": i, "status": "rejected", "detail": _invalid_zones_message(reading.temple_id)}
+            continue
+        
+        # Readings keep their gateway timestamps so replayed backlog lands in the right buckets.
+        # A future timestamp would hold the snapshot until the clock caught up, so refuse it.
+        timestamp = utc_naive(reading.timestamp)
+        if timestamp > latest_allowed:
+            results[i] = {"index": i, "status": "rejected", "detail": "Timestamp is in the future"}
+            continue
+        
+        crowd_docs.append({
+            **reading.model_dump(),
+            "timestamp": timestamp
+        })
+        doc_indexes.append(i)
+    
+    # Classify in time order so status hysteresis follows the replayed sequence
+    for doc in sorted(crowd_docs, key=lambda d: d["timestamp"]):
+        crowd_classifier.apply(doc)
+    
+    failed = set()
+    if crowd_docs:
+        try:
+            await crowd_collection.insert_many(crowd_docs, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                failed.add(error["index"])
+                results[doc_indexes[error["index"]]] = {
+                    "index": doc_indexes[error["index"]],
+                    "status": "failed",
+                    "detail": error.get("errmsg", "Write failed")
+                }
+    
+    stored = [doc for j, doc in enumerate(crowd_docs) if j not in failed]
+    if stored:
+        anomalies = await _publish_crowd_docs(stored, latest_collection, rollups_collection)
+        _push_anomalies(anomalies, background_tasks)
+    
+    return {
+        "accepted": len(stored),
+        "rejected": len(readings) - len(stored),
+        "results": results
+    }
+
 @router.get("/temple/{temple_id}/heatmap")
 async def get_crowd_heatmap(
     temple_id: str,
     date: Optional[datetime] = None,
-    crowd_collection = Depends(get_crowd_data_collection),
+    crowd_rollups = Depends(get_crowd_rollups_collection),
     current_user = Depends(get_current_authority_user)
 ):
     """Get crowd heatmap data for analytics (Authority only)"""
@@ -169,48 +385,15 @@ async def get_crowd_heatmap(
     start_of_day = date.replace(hour=0, minute=0, second=0, microsecond=0)
     end_of_day = start_of_day + timedelta(days=1)
     
+    # Read the hourly rollups (at most 24 x zones documents)
     query = {
         "temple_id": temple_id,
-        "timestamp": {"$gte": start_of_day, "$lt": end_of_day}
+        "resolution": "1h",
+        "bucket_start": {"$gte": start_of_day, "$lt": end_of_day}
     }
     
-    cursor = crowd_collection.find(query).sort("timestamp", 1)
-    data_points = await cursor.to_list(length=None)
-    
-    # Organize data by hour and zone
-    heatmap = {}
-    
-    for point in data_points:
-        hour = point["timestamp"].hour
-        
-        if hour not in heatmap:
-            heatmap[hour] = {}
-        
-        for zone in point.get("zones", []):
-            zone_id = zone["zone_id"]
-            
-            if zone_id not in heatmap[hour]:
-                heatmap[hour][zone_id] = []
-            
-            heatmap[hour][zone_id].append({
-                "density": zone["density"],
-                "count": zone["current_count"],
-                "timestamp": point["timestamp"]
-            })
-    
-    # Calculate averages
-    heatmap_avg = {}
-    for hour, zones in heatmap.items():
-        heatmap_avg[hour] = {}
-        for zone_id, readings in zones.items():
-            avg_density = sum(r["density"] for r in readings) / len(readings)
-            avg_count = sum(r["count"] for r in readings) / len(readings)
-            
-            heatmap_avg[hour][zone_id] = {
-                "average_density": avg_density,
-                "average_count": avg_count,
-                "readings_count": len(readings)
-            }
+    rollups = crowd_rollups.find(query, projection={"_id": 0})
+    heatmap_avg = rollups_to_heatmap(await rollups.to_list(length=None))
     
     return {
         "temple_id": temple_id,
@@ -221,7 +404,8 @@ async def get_crowd_heatmap(
 @router.get("/temple/{temple_id}/predictions")
 async def get_crowd_predictions(
     temple_id: str,
-    crowd_collection = Depends(get_crowd_data_collection)
+    hours_ahead: int = Query(1, ge=1, le=168),
+    crowd_rollups = Depends(get_crowd_rollups_collection)
 ):
     """Get predicted crowd levels based on historical data"""
     
@@ -231,62 +415,69 @@ async def get_crowd_predictions(
             detail="Temple not found"
         )
     
-    # Get historical data for same day of week and time
+    # Profiles are kept current in the background; this only catches up a stale worker
     current_time = datetime.utcnow()
-    day_of_week = current_time.weekday()
-    current_hour = current_time.hour
+    await prediction_engine.refresh(crowd_rollups, current_time)
     
-    # Get data from last 4 weeks for same day and hour
-    predictions = []
+    predictions = prediction_engine.predict(temple_id, current_time, hours_ahead)
+    current = predictions[0]
     
-    for weeks_ago in range(1, 5):
-        target_date = current_time - timedelta(weeks=weeks_ago)
-        start_time = target_date.replace(minute=0, second=0, microsecond=0)
-        end_time = start_time + timedelta(hours=1)
-        
-        query = {
-            "temple_id": temple_id,
-            "timestamp": {"$gte": start_time, "$lt": end_time}
-        }
-        
-        data = await crowd_collection.find_one(query, sort=[("timestamp", -1)])
-        
-        if data:
-            predictions.append({
-                "week_ago": weeks_ago,
-                "zones": data.get("zones", []),
-                "total_crowd": data.get("total_crowd", 0)
-            })
-    
-    if not predictions:
+    if not current["zone_predictions"]:
         return {
             "temple_id": temple_id,
             "predicted_crowd": "No historical data available",
             "confidence": "low"
         }
     
-    # Calculate average prediction
-    zone_predictions = {}
-    temple_info = settings.TEMPLES[temple_id]
+    return {
+        "temple_id": temple_id,
+        **current,
+        "hourly": predictions
+    }
+
+@router.get("/temple/{temple_id}/forecast")
+async def get_crowd_forecast(
+    temple_id: str,
+    minutes: List[int] = Query([15, 30, 45, 60]),
+    current_user = Depends(get_current_authority_user)
+):
+    """Get short-term zone density forecasts with confidence bands (Authority only)"""
     
-    for zone_id in temple_info["zones"]:
-        zone_densities = []
-        for pred in predictions:
-            for zone in pred.get("zones", []):
-                if zone.get("zone_id") == zone_id:
-                    zone_densities.append(zone.get("density", 0))
-        
-        if zone_densities:
-            avg_density = sum(zone_densities) / len(zone_densities)
-            zone_predictions[zone_id] = {
-                "predicted_density": avg_density,
-                "confidence": "high" if len(zone_densities) >= 3 else "medium"
-            }
+    if temple_id not in settings.TEMPLES:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Temple not found"
+        )
+    
+    if any(m < 1 or m > 180 for m in minutes):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Forecast horizons must be between 1 and 180 minutes"
+        )
     
     return {
         "temple_id": temple_id,
-        "day_of_week": day_of_week,
-        "hour": current_hour,
-        "zone_predictions": zone_predictions,
-        "based_on_weeks": len(predictions)
-    }
\ No newline at end of file
+        "generated_at": datetime.utcnow(),
+        "zones": crowd_forecaster.forecast(temple_id, minutes)
+    }
+
+@router.get("/temple/{temple_id}/stats")
+async def get_crowd_stats(
+    temple_id: str,
+    current_user = Depends(get_current_authority_user)
+):
+    """Get rolling per-zone crowd statistics (Authority only)"""
+    
+    if temple_id not in settings.TEMPLES:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Temple not found"
+        )
+    
+    now = datetime.utcnow()
+    
+    return {
+        "temple_id": temple_id,
+        "generated_at": now,
+        "zones": crowd_ring_buffer.stats(temple_id, now)
+    }
@@ -11,6 +11,7 @@ from ...database.mongodb_schemas import (
 )
 from ...database.mongodb_connection import get_emergencies_collection, get_event_logs_collection
 from ...config import settings
+from ...services.id_generator import id_generator
 from ..dependencies import get_current_user, get_current_authority_user
 from ...websocket.websocket_server import notify_emergency
 
@@ -40,7 +41,7 @@ async def report_emergency(
         )
     
     # Generate emergency ID
-    emergency_id = f"EMG{int(datetime.utcnow().timestamp() * 1000)}"
+    emergency_id = id_generator.next_id("EMG")
     
     # Create emergency document
     emergency_doc = {
@@ -6,6 +6,7 @@ from typing import List
 
 from ...database.mongodb_schemas import User, UserInDB
 from ...database.mongodb_connection import get_users_collection
+from ...services.user_cache import user_cache
 from ..dependencies import get_current_user, get_current_admin_user
 
 router = APIRouter()
@@ -62,6 +63,7 @@ async def update_current_user(
         {"_id": current_user["_id"]},
         {"$set": update_data}
     )
+    await user_cache.invalidate(str(current_user["_id"]))
     
     return {"message": "User updated successfully"}
 
@@ -88,4 +90,27 @@ async def list_users(
             created_at=u["created_at"]
         )
         for u in users
-    ]
\ No newline at end of file
+    ]
+
+@router.patch("/{user_id}/deactivate")
+async def deactivate_user(
+    user_id: str,
+    current_user = Depends(get_current_admin_user),
+    users_collection = Depends(get_users_collection)
+):
+    """Deactivate a user account (Admin only)"""
+    
+    result = await users_collection.update_one(
+        {"_id": user_id},
+        {"$set": {"is_active": False}}
+    )
+    
+    if not result.matched_count:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    
+    await user_cache.invalidate(user_id)
+    
+    return {"message": "User deactivated successfully"}
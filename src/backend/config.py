@@ -3,7 +3,7 @@ Configuration settings for Pilgrims Window Backend
 """
 import os
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 
 class Settings(BaseSettings):
     # Application
@@ -14,6 +14,7 @@ class Settings(BaseSettings):
     # Server
     HOST: str = "0.0.0.0"
     PORT: int = 8000
+    API_BASE_URL: str = "http://localhost:8000"  # public origin used in absolute links, e.g. QR images
     
     # MongoDB
     MONGODB_URL: str = "mongodb://localhost:27017"
@@ -23,12 +24,20 @@ class Settings(BaseSettings):
     
     # Redis (for WebSocket scaling and caching)
     REDIS_URL: str = "redis://localhost:6379"
+    REDIS_ENABLED: bool = False  # cross-worker invalidation and shared counters
     
     # Security
     SECRET_KEY: str = "your-secret-key-change-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    PASSWORD_HASH_WORKERS: int = 2  # bcrypt threads per process
+    PASSWORD_HASH_MAX_PENDING: int = 32  # running or queued before logins get 503
+    
+    # User Cache
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL: float = 60.0  # seconds; bounds staleness without Redis
+    USER_CACHE_INVALIDATION_CHANNEL: str = "pw:user-cache:invalidate"
     
     # CORS
     ALLOWED_ORIGINS: List[str] = [
@@ -43,12 +52,64 @@ class Settings(BaseSettings):
     
     # Real-time Updates
     CROWD_UPDATE_INTERVAL: int = 5  # seconds
+    CROWD_CHANGE_STREAMS_ENABLED: bool = False  # push other workers' crowd writes; needs a replica set
     SHUTTLE_UPDATE_INTERVAL: int = 10  # seconds
+    CROWD_CACHE_MAX_STALENESS: float = 1.0  # seconds before other workers' writes are seen
+    CROWD_BULK_MAX_READINGS: int = 5000  # max readings per bulk ingest request
+    CROWD_BULK_MAX_CLOCK_SKEW: float = 60.0  # seconds a bulk reading may be ahead of server time
+    
+    # Crowd History Retention
+    CROWD_RAW_RETENTION_DAYS: int = 7
+    CROWD_ROLLUP_RETENTION_DAYS: dict = {
+        "1m": 2,
+        "5m": 14,
+        "1h": 90,
+        "1d": 730
+    }
+    CROWD_HISTORY_POINT_BUDGET: int = 1000  # max points returned per zone
+    CROWD_HISTORY_STREAM_POINT_BUDGET: int = 200000  # max points read for streamed/downsampled history
+    CROWD_PREDICTION_WEEKS: int = 4  # weeks of hourly rollups in the seasonal profile
+    CROWD_PREDICTION_GRACE_MINUTES: float = 10.0  # wait after an hour ends before folding it in
+    CROWD_PREDICTION_REFRESH_INTERVAL: float = 60.0  # seconds between background profile refreshes
+    CROWD_FORECAST_LEVEL_MINUTES: float = 3.0  # smoothing time constant for the level
+    CROWD_FORECAST_TREND_MINUTES: float = 10.0  # smoothing time constant for the trend
+    CROWD_STATS_BUFFER_SIZE: int = 1024  # readings kept per zone for rolling statistics
+    
+    # ID Generation
+    ID_WORKER_ID: Optional[int] = None  # 0-1023, unique per process; leased from MongoDB if unset
+    ID_WORKER_LEASE_SECONDS: float = 60.0  # renewed every third of this
+    
+    # Bookings
+    BOOKING_SLOT_CAPACITY: int = 50  # pilgrims per time slot unless a temple sets slot_capacity
+    BOOKING_TIME_SLOTS: list = [
+        "06:00-08:00", "08:00-10:00", "10:00-12:00",
+        "12:00-14:00", "14:00-16:00", "16:00-18:00",
+        "18:00-20:00", "20:00-22:00"
+    ]
+    BOOKING_AVAILABILITY_CACHE_TTL: float = 30.0  # seconds a day's availability is served from memory
+    BOOKING_CALENDAR_MAX_DAYS: int = 60
+    BOOKING_GROUP_MAX_SIZE: int = 20  # bookings in one group request
+    
+    # Booking Waiting Room
+    WAITING_ROOM_ENABLED: bool = False  # require an admitted queue token to create bookings
+    WAITING_ROOM_RATE: float = 20.0  # initial bookings admitted per second
+    WAITING_ROOM_MIN_RATE: float = 2.0  # also the additive increase step
+    WAITING_ROOM_MAX_RATE: float = 200.0
+    WAITING_ROOM_ADAPTIVE: bool = True  # follow measured booking latency
+    WAITING_ROOM_TARGET_LATENCY: float = 0.5  # seconds per booking before the rate is halved
+    WAITING_ROOM_ADMISSION_TTL: float = 300.0  # seconds an admitted token stays valid
     
     # QR Code
     QR_CODE_SIZE: int = 300
     QR_CODE_BORDER: int = 2
+    QR_CODE_WORKERS: int = 2  # size of the rendering pool
+    QR_CODE_EXECUTOR: str = "process"  # "process" or "thread"
+    QR_TOKEN_SECRET: str = ""  # signs booking QR tokens; falls back to SECRET_KEY
+    CHECKIN_BATCH_MAX_SCANS: int = 5000
     QR_CODE_STORAGE_PATH: str = "./storage/qrcodes"
+    QR_CODE_CACHE_MAX_AGE_DAYS: int = 30  # cached images older than this are removed and re-rendered on demand
+    QR_CODE_CACHE_MAX_MB: int = 512  # oldest images are removed beyond this size
+    QR_IMAGE_URL_TTL: int = 3600  # seconds a signed QR image link stays valid, at least
     
     # File Storage
     UPLOAD_DIR: str = "./storage/uploads"
@@ -68,8 +129,14 @@ class Settings(BaseSettings):
     ANALYTICS_RETENTION_DAYS: int = 365
     
     # Rate Limiting
+    RATE_LIMIT_ENABLED: bool = True
     RATE_LIMIT_PER_MINUTE: int = 60
     RATE_LIMIT_PER_HOUR: int = 1000
+    RATE_LIMIT_AUTH_PER_MINUTE: int = 10  # login, register and refresh
+    RATE_LIMIT_AUTH_PER_HOUR: int = 100
+    RATE_LIMIT_INGEST_PER_MINUTE: int = 600  # crowd readings and shuttle GPS updates
+    RATE_LIMIT_INGEST_PER_HOUR: int = 30000
+    RATE_LIMIT_TRUST_FORWARDED: bool = False  # key anonymous clients by X-Forwarded-For behind a proxy
     
     # Temple Configuration
     TEMPLES: dict = {
@@ -103,6 +170,19 @@ class Settings(BaseSettings):
     CROWD_THRESHOLD_LOW: int = 30
     CROWD_THRESHOLD_MODERATE: int = 60
     CROWD_THRESHOLD_HIGH: int = 80
+    CROWD_STATUS_HYSTERESIS: float = 5.0  # density points below a threshold before status steps down
+    CROWD_ZONE_DWELL_MINUTES: float = 15.0  # nominal dwell time when no throughput is observed
+    CROWD_THROUGHPUT_SMOOTHING: float = 0.3  # EWMA weight of each observed throughput
+    CROWD_LOG_SUMMARY_INTERVAL: int = 300  # seconds between summaries of a congested zone
+    CROWD_ANOMALY_Z_THRESHOLD: float = 4.0  # robust z-score that raises an anomaly
+    CROWD_ANOMALY_STEP: float = 0.005  # step size of the running median/MAD estimates; larger steps jitter the MAD and inflate false alarms
+    CROWD_ANOMALY_WARMUP_READINGS: int = 30  # readings per zone before anomalies are raised
+    CROWD_ANOMALY_COOLDOWN: int = 60  # seconds between anomalies for the same zone
+    
+    # Event Logging
+    EVENT_LOG_FLUSH_INTERVAL: float = 1.0  # seconds
+    EVENT_LOG_BATCH_SIZE: int = 500
+    EVENT_LOG_MAX_BUFFER: int = 10000
     
     class Config:
         env_file = ".env"
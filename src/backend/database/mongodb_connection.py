@@ -4,6 +4,7 @@ Handles database connection, initialization, and collection access
 """
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo import ASCENDING, DESCENDING, GEOSPHERE
+from pymongo.errors import OperationFailure
 from typing import Optional
 import logging
 from ..config import settings
@@ -17,7 +18,11 @@ class MongoDB:
     # Collection references
     users = None
     bookings = None
+    booking_slots = None
+    booking_waitlist = None
     crowd_data = None
+    crowd_latest = None
+    crowd_rollups = None
     shuttles = None
     emergencies = None
     alerts = None
@@ -26,6 +31,7 @@ class MongoDB:
     daily_analytics = None
     incidents = None
     event_logs = None
+    id_workers = None
 
 async def connect_to_mongo():
     """Connect to MongoDB and initialize collections"""
@@ -43,7 +49,11 @@ async def connect_to_mongo():
         # Initialize collection references
         MongoDB.users = MongoDB.db.users
         MongoDB.bookings = MongoDB.db.bookings
+        MongoDB.booking_slots = MongoDB.db.booking_slots
+        MongoDB.booking_waitlist = MongoDB.db.booking_waitlist
         MongoDB.crowd_data = MongoDB.db.crowd_data
+        MongoDB.crowd_latest = MongoDB.db.crowd_latest
+        MongoDB.crowd_rollups = MongoDB.db.crowd_rollups
         MongoDB.shuttles = MongoDB.db.shuttles
         MongoDB.emergencies = MongoDB.db.emergencies
         MongoDB.alerts = MongoDB.db.alerts
@@ -52,6 +62,7 @@ async def connect_to_mongo():
         MongoDB.daily_analytics = MongoDB.db.daily_analytics
         MongoDB.incidents = MongoDB.db.incidents
         MongoDB.event_logs = MongoDB.db.event_logs
+        MongoDB.id_workers = MongoDB.db.id_workers
         
         # Create indexes
         await create_indexes()
@@ -93,6 +104,30 @@ async def create_indexes():
             ("time_slot", ASCENDING)
         ])
         
+        # Booking slot counter indexes
+        await MongoDB.booking_slots.create_index([
+            ("temple_id", ASCENDING),
+            ("booking_date", ASCENDING),
+            ("time_slot", ASCENDING)
+        ], unique=True)
+        
+        # Booking waitlist indexes
+        await MongoDB.booking_waitlist.create_index([("waitlist_id", ASCENDING)], unique=True)
+        await MongoDB.booking_waitlist.create_index([
+            ("temple_id", ASCENDING),
+            ("booking_date", ASCENDING),
+            ("time_slot", ASCENDING),
+            ("status", ASCENDING),
+            ("waitlist_id", ASCENDING)
+        ])
+        await MongoDB.booking_waitlist.create_index([
+            ("temple_id", ASCENDING),
+            ("booking_date", ASCENDING),
+            ("time_slot", ASCENDING),
+            ("user_id", ASCENDING)
+        ], unique=True, partialFilterExpression={"status": "waiting"})
+        await MongoDB.booking_waitlist.create_index([("user_id", ASCENDING), ("created_at", DESCENDING)])
+        
         # Crowd data indexes
         await MongoDB.crowd_data.create_index([("temple_id", ASCENDING)])
         await MongoDB.crowd_data.create_index([("timestamp", DESCENDING)])
@@ -100,10 +135,24 @@ async def create_indexes():
             ("temple_id", ASCENDING),
             ("timestamp", DESCENDING)
         ])
-        # TTL index - remove crowd data older than 7 days
-        await MongoDB.crowd_data.create_index(
+        # TTL index - raw crowd data is kept only until it is covered by rollups
+        await ensure_ttl_index(
+            MongoDB.crowd_data,
             [("timestamp", DESCENDING)],
-            expireAfterSeconds=7 * 24 * 60 * 60
+            settings.CROWD_RAW_RETENTION_DAYS * 24 * 60 * 60
+        )
+        
+        # Crowd rollup indexes
+        await MongoDB.crowd_rollups.create_index([
+            ("temple_id", ASCENDING),
+            ("resolution", ASCENDING),
+            ("bucket_start", ASCENDING),
+            ("zone_id", ASCENDING)
+        ], unique=True)
+        # TTL index - each rollup tier sets its own expires_at on insert
+        await MongoDB.crowd_rollups.create_index(
+            [("expires_at", ASCENDING)],
+            expireAfterSeconds=0
         )
         
         # Shuttles indexes
@@ -189,6 +238,21 @@ async def create_indexes():
         logger.error(f"Error creating indexes: {e}")
         raise
 
+async def ensure_ttl_index(collection, keys, expire_after_seconds: int):
+    """Create a TTL index, updating its expiry in place if the retention changed"""
+    try:
+        await collection.create_index(keys, expireAfterSeconds=expire_after_seconds)
+    except OperationFailure as e:
+        # IndexOptionsConflict - the index exists with a different expiry
+        if e.code != 85:
+            raise
+        await MongoDB.db.command(
+            "collMod",
+            collection.name,
+            index={"keyPattern": dict(keys), "expireAfterSeconds": expire_after_seconds}
+        )
+        logger.info(f"Updated TTL on {collection.name} to {expire_after_seconds} seconds")
+
 async def get_database():
     """Get database instance for dependency injection"""
     return MongoDB.db
@@ -200,9 +264,21 @@ async def get_users_collection():
 async def get_bookings_collection():
     return MongoDB.bookings
 
+async def get_booking_slots_collection():
+    return MongoDB.booking_slots
+
+async def get_booking_waitlist_collection():
+    return MongoDB.booking_waitlist
+
 async def get_crowd_data_collection():
     return MongoDB.crowd_data
 
+async def get_crowd_latest_collection():
+    return MongoDB.crowd_latest
+
+async def get_crowd_rollups_collection():
+    return MongoDB.crowd_rollups
+
 async def get_shuttles_collection():
     return MongoDB.shuttles
 
@@ -225,4 +301,7 @@ async def get_incidents_collection():
     return MongoDB.incidents
 
 async def get_event_logs_collection():
-    return MongoDB.event_logs
\ No newline at end of file
+    return MongoDB.event_logs
+
+async def get_id_workers_collection():
+    return MongoDB.id_workers
@@ -20,6 +20,11 @@ class BookingStatus(str, Enum):
     CANCELLED = "cancelled"
     COMPLETED = "completed"
 
+class WaitlistStatus(str, Enum):
+    WAITING = "waiting"
+    PROMOTED = "promoted"
+    CANCELLED = "cancelled"
+
 class EmergencyType(str, Enum):
     MEDICAL = "medical"
     SECURITY = "security"
@@ -99,7 +104,7 @@ class BookingBase(BaseModel):
     zone: str
     booking_date: datetime
     time_slot: str
-    number_of_people: int = 1
+    number_of_people: int = Field(1, ge=1)
     special_assistance: Optional[str] = None
     pilgrim_name: str
     pilgrim_phone: str
@@ -109,13 +114,14 @@ class BookingCreate(BookingBase):
 
 class BookingInDB(BookingBase):
     id: str = Field(alias="_id")
-    booking_id: str  # Human readable ID like BK1234567890
+    booking_id: str  # Human readable, time-sortable ID like BK0370045993753141248
     status: BookingStatus = BookingStatus.CONFIRMED
-    qr_code_url: str
+    qr_code_url: Optional[str] = None  # legacy embedded image, no longer stored
     qr_code_data: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
     checked_in: bool = False
     checked_in_at: Optional[datetime] = None
+    group_id: Optional[str] = None  # shared by bookings made together
     
     class Config:
         populate_by_name = True
@@ -126,24 +132,31 @@ class Booking(BookingBase):
     status: BookingStatus
     qr_code_url: str
     created_at: datetime
+    group_id: Optional[str] = None
+
+class GateScan(BaseModel):
+    token: str  # qr_code_data read at the gate
+    scanned_at: datetime
+    gate_id: Optional[str] = None
 
 # ==================== CROWD MONITORING MODELS ====================
 
 class ZoneCrowdData(BaseModel):
     zone_id: str
-    zone_name: str
-    density: float  # 0-100 percentage
+    zone_name: Optional[str] = None
+    density: Optional[float] = None  # 0-100 percentage, derived from counts if omitted
     current_count: int
     max_capacity: int
-    wait_time_minutes: int
-    status: CrowdStatus
+    throughput_per_minute: Optional[float] = None  # observed exits, used for wait time
+    wait_time_minutes: Optional[int] = None  # derived on ingest
+    status: Optional[CrowdStatus] = None  # derived on ingest
     last_updated: datetime = Field(default_factory=datetime.utcnow)
 
 class CrowdDataPoint(BaseModel):
     temple_id: str
-    temple_name: str
+    temple_name: Optional[str] = None
     zones: List[ZoneCrowdData]
-    total_crowd: int
+    total_crowd: Optional[int] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     
 class CrowdDataInDB(CrowdDataPoint):
@@ -211,7 +224,7 @@ class EmergencyCreate(EmergencyBase):
 
 class EmergencyInDB(EmergencyBase):
     id: str = Field(alias="_id")
-    emergency_id: str  # Human readable ID like EMG1234567890
+    emergency_id: str  # Human readable, time-sortable ID like EMG0370045993753141248
     user_id: Optional[str] = None
     status: EmergencyStatus = EmergencyStatus.REPORTED
     assigned_to: Optional[str] = None  # Authority user ID
@@ -355,6 +368,7 @@ class Incident(IncidentBase):
 
 class EventType(str, Enum):
     CROWD_UPDATE = "crowd_update"
+    CROWD_ANOMALY = "crowd_anomaly"
     BOOKING = "booking"
     EMERGENCY = "emergency"
     ALERT = "alert"
@@ -0,0 +1,29 @@
+"""
+Crowd Rollup Backfill
+Builds crowd_rollups from the raw readings in crowd_data, e.g. after first deploying rollups
+
+Run from src/:
+    python -m backend.scripts.backfill_crowd_rollups
+"""
+import asyncio
+
+from ..database.mongodb_connection import (
+    connect_to_mongo,
+    close_mongo_connection,
+    get_crowd_data_collection
+)
+from ..services.crowd_rollups import backfill_rollups
+
+async def main():
+    await connect_to_mongo()
+    try:
+        rebuilt = await backfill_rollups(await get_crowd_data_collection())
+        if not rebuilt:
+            print("No raw crowd readings to backfill from")
+        for resolution, (start, end) in rebuilt.items():
+            print(f"{resolution:<3} rebuilt {start.isoformat()} to {end.isoformat()}")
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
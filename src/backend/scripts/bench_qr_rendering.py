@@ -0,0 +1,114 @@
+"""
+QR Rendering Benchmark
+Measures latency of unrelated requests while the QR image endpoint renders images
+
+Run from src/:
+    python -m backend.scripts.bench_qr_rendering --rate 500 --seconds 5
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from ..services.booking_tokens import sign_booking_token
+from ..services.qr_codes import QRImageStore, QRRenderer, render_qr_png
+
+DB_ROUND_TRIP = 0.002  # simulated MongoDB latency per request
+
+class InlineRenderer:
+    """Renders on the event loop, as bookings did before the worker pool"""
+    
+    async def render(self, qr_data: str) -> bytes:
+        return render_qr_png(qr_data)
+    
+    def shutdown(self):
+        pass
+
+def booking_token(n: int) -> str:
+    return sign_booking_token(f"BK{n:019d}", "somnath", datetime(2026, 1, 1), "06:00-08:00", 2)
+
+async def get_qr_image(store: QRImageStore, n: int):
+    # GET /api/bookings/{id}/qr: booking lookup, then the image from disk or rendered
+    await asyncio.sleep(DB_ROUND_TRIP)
+    await store.get_png(booking_token(n))
+
+async def co_tenant(latencies: list, stop: asyncio.Event):
+    # An unrelated endpoint every 10 ms. Latency counts from the scheduled
+    # arrival, so time the loop spends blocked is included rather than skipped.
+    next_arrival = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+        await asyncio.sleep(DB_ROUND_TRIP)
+        latencies.append(time.perf_counter() - next_arrival)
+        next_arrival += 0.01
+
+async def run(mode: str, rate: int, seconds: float, workers: int, hit_ratio: float) -> dict:
+    renderer = InlineRenderer() if mode == "inline" else QRRenderer(workers, mode)
+    if mode != "inline":
+        # Start the pool before measuring
+        await renderer.render("warmup")
+    
+    with tempfile.TemporaryDirectory() as path:
+        store = QRImageStore(path, renderer, max_age=3600, max_bytes=1 << 30)
+        
+        # Images already on disk, requested again at `hit_ratio`
+        cached = max(1, int(rate * seconds * hit_ratio))
+        for n in range(cached):
+            store._write(store._file(store.digest(booking_token(n))), render_qr_png(booking_token(n)))
+        
+        latencies = []
+        stop = asyncio.Event()
+        probe = asyncio.create_task(co_tenant(latencies, stop))
+        
+        # Image requests arrive at `rate` per second
+        tasks = []
+        started = time.perf_counter()
+        n = cached
+        while time.perf_counter() - started < seconds:
+            elapsed = time.perf_counter() - started
+            while len(tasks) < elapsed * rate:
+                if random.random() < hit_ratio:
+                    booking = random.randrange(cached)
+                else:
+                    booking = n
+                    n += 1
+                tasks.append(asyncio.create_task(get_qr_image(store, booking)))
+            await asyncio.sleep(0.01)
+        
+        await asyncio.gather(*tasks)
+        total = time.perf_counter() - started
+        stop.set()
+        await probe
+    renderer.shutdown()
+    
+    ms = np.array(latencies) * 1000
+    return {
+        "mode": mode,
+        "images_per_second": round(len(tasks) / total, 1),
+        "rendered": n - cached,
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "max_ms": round(float(ms.max()), 2)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=int, default=500, help="QR image requests per second")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--hit-ratio", type=float, default=0.0, help="share of requests for images already on disk")
+    parser.add_argument("--modes", default="inline,thread,process")
+    args = parser.parse_args()
+    
+    print(f"{'mode':<8} {'images/s':>9} {'rendered':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for mode in args.modes.split(","):
+        result = asyncio.run(run(mode, args.rate, args.seconds, args.workers, args.hit_ratio))
+        print(f"{result['mode']:<8} {result['images_per_second']:>9} {result['rendered']:>9} "
+              f"{result['p50_ms']:>8} {result['p99_ms']:>8} {result['max_ms']:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+Booking QR Image Cleanup
+Removes the base64 QR images older bookings embedded in qr_code_url; images are now served from /api/bookings/{id}/qr
+
+Run from src/:
+    python -m backend.scripts.strip_booking_qr_images
+"""
+import asyncio
+
+from ..database.mongodb_connection import (
+    connect_to_mongo,
+    close_mongo_connection,
+    get_bookings_collection
+)
+
+async def main():
+    await connect_to_mongo()
+    try:
+        bookings_collection = await get_bookings_collection()
+        result = await bookings_collection.update_many(
+            {"qr_code_url": {"$exists": True}},
+            {"$unset": {"qr_code_url": ""}}
+        )
+        print(f"Removed embedded QR images from {result.modified_count} bookings")
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+"""
+Booking QR Tokens
+Compact HMAC-signed tokens that gate devices can verify without the database
+"""
+import base64
+import hashlib
+import hmac
+import time
+from datetime import datetime
+from typing import Optional
+
+from ..config import settings
+
+TOKEN_PREFIX = "PW1"
+SIGNATURE_BYTES = 16
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def temple_key(temple_id: str) -> bytes:
+    """
+    Signing key for one temple's bookings.
+
+    Derived from QR_TOKEN_SECRET so a key provisioned to one temple's
+    gate devices cannot mint or verify tokens for another temple.
+    """
+    secret = (settings.QR_TOKEN_SECRET or settings.SECRET_KEY).encode()
+    return hmac.new(secret, f"gate:{temple_id}".encode(), hashlib.sha256).digest()
+
+def _sign(payload: str, key: bytes) -> str:
+    return _b64encode(hmac.new(key, payload.encode(), hashlib.sha256).digest()[:SIGNATURE_BYTES])
+
+def sign_booking_token(booking_id: str, temple_id: str, booking_date: datetime,
+                       time_slot: str, number_of_people: int) -> str:
+    """
+    Build the token encoded in a booking's QR code:
+    PW1.<booking_id>.<temple_id>.<yyyymmdd>.<time_slot>.<people>.<signature>
+    """
+    payload = ".".join([
+        TOKEN_PREFIX,
+        booking_id,
+        temple_id,
+        booking_date.strftime("%Y%m%d"),
+        time_slot,
+        str(number_of_people)
+    ])
+    return f"{payload}.{_sign(payload, temple_key(temple_id))}"
+
+def verify_booking_token(token: str, key: Optional[bytes] = None) -> Optional[dict]:
+    """Decode a token, returning None if it is malformed or its signature is wrong"""
+    payload, _, signature = token.rpartition(".")
+    parts = payload.split(".")
+    if len(parts) != 6 or parts[0] != TOKEN_PREFIX:
+        return None
+
+    _, booking_id, temple_id, date_text, time_slot, people = parts
+    if key is None:
+        if temple_id not in settings.TEMPLES:
+            return None
+        key = temple_key(temple_id)
+
+    # Compare bytes: compare_digest raises on non-ASCII str, and scanned tokens are untrusted
+    if not hmac.compare_digest(signature.encode(), _sign(payload, key).encode()):
+        return None
+
+    try:
+        booking_date = datetime.strptime(date_text, "%Y%m%d")
+        number_of_people = int(people)
+    except ValueError:
+        return None
+
+    return {
+        "booking_id": booking_id,
+        "temple_id": temple_id,
+        "booking_date": booking_date,
+        "time_slot": time_slot,
+        "number_of_people": number_of_people
+    }
+
+def export_gate_key(temple_id: str) -> str:
+    """Temple key encoded for provisioning gate devices"""
+    return _b64encode(temple_key(temple_id))
+
+def _image_key() -> bytes:
+    return hmac.new(settings.SECRET_KEY.encode(), b"qr-image", hashlib.sha256).digest()
+
+def sign_qr_image_link(booking_id: str, ttl: int) -> dict:
+    """
+    Query parameters granting access to a booking's QR image.
+
+    Expiry is rounded up to a multiple of `ttl`, so a link stays the same
+    for a while and browsers can cache the image; it is valid for at least
+    `ttl` and at most twice that.
+    """
+    expires = (int(time.time()) // ttl + 2) * ttl
+    return {"expires": expires, "signature": _sign(f"{booking_id}.{expires}", _image_key())}
+
+def verify_qr_image_link(booking_id: str, expires: int, signature: str) -> bool:
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(signature.encode(), _sign(f"{booking_id}.{expires}", _image_key()).encode())
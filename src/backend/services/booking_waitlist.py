@@ -0,0 +1,82 @@
+"""
+Booking Waitlist
+Ordered per temple/date/slot queue of pilgrims waiting for places
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from ..database.mongodb_schemas import WaitlistStatus
+from .id_generator import id_generator
+from .slot_counters import slot_key
+
+async def enqueue(waitlist, booking: dict, user_id: str) -> dict:
+    """
+    Add a booking request to its slot's waitlist.
+
+    Waitlist IDs are time-sortable, so they double as queue order. Raises
+    DuplicateKeyError if the user is already waiting for the slot.
+    """
+    entry = {
+        "waitlist_id": id_generator.next_id("WL"),
+        **slot_key(booking["temple_id"], booking["booking_date"], booking["time_slot"]),
+        "user_id": user_id,
+        "number_of_people": booking["number_of_people"],
+        "booking": booking,
+        "status": WaitlistStatus.WAITING,
+        "created_at": datetime.utcnow()
+    }
+    await waitlist.insert_one(entry)
+    return entry
+
+async def position(waitlist, entry: dict) -> int:
+    """1-based place of a waiting entry in its slot's queue"""
+    ahead = await waitlist.count_documents({
+        **slot_key(entry["temple_id"], entry["booking_date"], entry["time_slot"]),
+        "status": WaitlistStatus.WAITING,
+        "waitlist_id": {"$lt": entry["waitlist_id"]}
+    })
+    return ahead + 1
+
+def _waiting(temple_id: str, booking_date: datetime, time_slot: str, max_people: Optional[int]) -> dict:
+    query = {**slot_key(temple_id, booking_date, time_slot), "status": WaitlistStatus.WAITING}
+    if max_people is not None:
+        query["number_of_people"] = {"$lte": max_people}
+    return query
+
+async def head(waitlist, temple_id: str, booking_date: datetime, time_slot: str,
+               max_people: Optional[int] = None) -> Optional[dict]:
+    """First waiting entry for a slot, optionally the first whose party fits in `max_people` places"""
+    cursor = waitlist.find(
+        _waiting(temple_id, booking_date, time_slot, max_people)
+    ).sort("waitlist_id", 1).limit(1)
+    entries: List[dict] = await cursor.to_list(length=1)
+    return entries[0] if entries else None
+
+async def has_waiting(waitlist, temple_id: str, booking_date: datetime, time_slot: str,
+                      max_people: Optional[int] = None) -> bool:
+    """Whether anyone is waiting for a slot, optionally only parties that fit in `max_people` places"""
+    entry = await waitlist.find_one(
+        _waiting(temple_id, booking_date, time_slot, max_people),
+        projection={"_id": 1}
+    )
+    return entry is not None
+
+async def claim(waitlist, entry: dict, booking_id: str) -> bool:
+    """Mark a waiting entry promoted; False if it was promoted or cancelled meanwhile"""
+    result = await waitlist.update_one(
+        {"_id": entry["_id"], "status": WaitlistStatus.WAITING},
+        {"$set": {
+            "status": WaitlistStatus.PROMOTED,
+            "booking_id": booking_id,
+            "promoted_at": datetime.utcnow()
+        }}
+    )
+    return result.modified_count == 1
+
+async def unclaim(waitlist, entry: dict):
+    """Return a claimed entry to the queue after a failed promotion"""
+    await waitlist.update_one(
+        {"_id": entry["_id"], "status": WaitlistStatus.PROMOTED},
+        {"$set": {"status": WaitlistStatus.WAITING},
+         "$unset": {"booking_id": "", "promoted_at": ""}}
+    )
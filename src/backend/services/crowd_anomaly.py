@@ -0,0 +1,155 @@
+"""
+Crowd Anomaly Detection
+Streaming robust z-scores of zone density and cross-zone flow on every ingest
+"""
+from datetime import datetime
+from typing import List
+import numpy as np
+
+from ..config import settings
+from .crowd_predictions import prediction_engine
+from .crowd_rollups import EPOCH
+from .crowd_zones import MAX_ZONES, TEMPLE_IDS, TEMPLE_INDEX, ZONE_INDEX
+
+# Scales a median absolute deviation to a normal standard deviation
+MAD_SCALE = 0.6745
+
+# Smallest deviation treated as meaningful, so flat series do not divide by zero
+DENSITY_FLOOR = 1.0
+FLOW_FLOOR = 1.0
+
+class CrowdAnomalyDetector:
+    """
+    Tracks, per zone, a running median and median absolute deviation of
+    density above its seasonal baseline and of its count change relative to
+    the temple's other zones. Both are updated with sign-based stochastic
+    steps, so a single outlier moves them by at most one step and each
+    update is O(zones^2) over a temple's handful of zones.
+    
+    Density is only scored where the prediction engine has a baseline for
+    the zone's weekday and hour; until then no residual is tracked and no
+    anomaly is raised for that zone.
+    """
+    
+    def __init__(self, threshold: float, step: float, warmup: int, cooldown_seconds: float):
+        self.threshold = threshold
+        self.step = step
+        self.warmup = warmup
+        self.cooldown_seconds = cooldown_seconds
+        
+        shape = (len(TEMPLE_IDS), MAX_ZONES)
+        self.residual_median = np.zeros(shape)
+        self.residual_mad = np.full(shape, DENSITY_FLOOR)
+        self.flow_median = np.zeros(shape)
+        self.flow_mad = np.full(shape, FLOW_FLOOR)
+        self.last_count = np.full(shape, np.nan)
+        self.last_flow_z = np.zeros(shape)
+        self.readings = np.zeros(shape, dtype=np.int64)
+        self.residual_readings = np.zeros(shape, dtype=np.int64)
+        self.last_alert = np.full(shape, -np.inf)  # seconds since epoch
+    
+    @staticmethod
+    def _track(median: np.ndarray, mad: np.ndarray, x: np.ndarray, step: np.ndarray, floor: float):
+        scale = np.maximum(mad, floor)
+        median += step * scale * np.sign(x - median)
+        mad += step * scale * np.sign(np.abs(x - median) - mad)
+        np.maximum(mad, floor, out=mad)
+    
+    def observe(self, crowd_doc: dict) -> List[dict]:
+        """Score one reading and return any anomalies it reveals"""
+        temple_id = crowd_doc["temple_id"]
+        timestamp: datetime = crowd_doc["timestamp"]
+        zones = crowd_doc["zones"]
+        if not zones:
+            return []
+        
+        row = TEMPLE_INDEX[temple_id]
+        cols = np.array([ZONE_INDEX[temple_id][zone["zone_id"]] for zone in zones], dtype=np.intp)
+        density = np.array([zone["density"] for zone in zones], dtype=np.float64)
+        counts = np.array([zone["current_count"] for zone in zones], dtype=np.float64)
+        now = (timestamp - EPOCH).total_seconds()
+        
+        # Density above what this weekday and hour usually looks like
+        baseline = prediction_engine.baseline(temple_id, timestamp)[cols]
+        scored = ~np.isnan(baseline)
+        residual = density - np.nan_to_num(baseline)
+        
+        # Count change of each zone relative to the other zones' typical change.
+        # Leaving the zone out of the reference keeps its own change from pulling
+        # the median, which would give flow a heavy-tailed, non-normal spread.
+        delta = np.nan_to_num(counts - self.last_count[row, cols])
+        if len(zones) > 1:
+            others = np.broadcast_to(delta, (len(zones), len(zones)))[~np.eye(len(zones), dtype=bool)]
+            flow = delta - np.median(others.reshape(len(zones), -1), axis=1)
+        else:
+            flow = delta
+        
+        residual_median = self.residual_median[row, cols]
+        residual_mad = self.residual_mad[row, cols]
+        flow_median = self.flow_median[row, cols]
+        flow_mad = self.flow_mad[row, cols]
+        
+        density_z = MAD_SCALE * (residual - residual_median) / residual_mad
+        flow_z = MAD_SCALE * (flow - flow_median) / flow_mad
+        
+        readings = self.readings[row, cols]
+        residual_readings = self.residual_readings[row, cols]
+        warmed_up = (readings >= self.warmup) & (residual_readings >= self.warmup)
+        cooled_down = now - self.last_alert[row, cols] >= self.cooldown_seconds
+        # Count changes are noisy on their own and a noise spike reverses on the next
+        # reading, so a flow surge must have started on the previous reading and
+        # density must be rising too
+        surging = (density_z >= self.threshold) | (
+            (flow_z >= self.threshold)
+            & (self.last_flow_z[row, cols] >= self.threshold / 2)
+            & (density_z >= self.threshold / 2)
+            & (delta > 0)
+        )
+        anomalous = scored & warmed_up & cooled_down & surging
+        
+        # Larger steps while warming up so the estimates converge from the first readings
+        step = np.maximum(self.step, 1 / (readings + 1))
+        first = readings == 0
+        flow_median[first] = flow[first]
+        self._track(flow_median, flow_mad, flow, step, FLOW_FLOOR)
+        
+        # Residuals only exist where there is a baseline
+        residual_step = np.maximum(self.step, 1 / (residual_readings + 1))
+        first = scored & (residual_readings == 0)
+        residual_median[first] = residual[first]
+        scored_median, scored_mad = residual_median[scored], residual_mad[scored]
+        self._track(scored_median, scored_mad, residual[scored], residual_step[scored], DENSITY_FLOOR)
+        residual_median[scored] = scored_median
+        residual_mad[scored] = scored_mad
+        self.residual_median[row, cols] = residual_median
+        self.residual_mad[row, cols] = residual_mad
+        self.flow_median[row, cols] = flow_median
+        self.flow_mad[row, cols] = flow_mad
+        self.last_count[row, cols] = counts
+        self.last_flow_z[row, cols] = flow_z
+        self.readings[row, cols] += 1
+        self.residual_readings[row, cols] += scored
+        self.last_alert[row, cols[anomalous]] = now
+        
+        return [
+            {
+                "temple_id": temple_id,
+                "zone_id": zones[i]["zone_id"],
+                "zone_name": zones[i]["zone_name"],
+                "density": float(density[i]),
+                "expected_density": None if np.isnan(baseline[i]) else float(baseline[i]),
+                "density_z": float(density_z[i]),
+                "flow_z": float(flow_z[i]),
+                "count_change": float(delta[i]),
+                "timestamp": timestamp
+            }
+            for i in np.flatnonzero(anomalous)
+        ]
+
+# Global anomaly detector instance
+crowd_anomaly_detector = CrowdAnomalyDetector(
+    threshold=settings.CROWD_ANOMALY_Z_THRESHOLD,
+    step=settings.CROWD_ANOMALY_STEP,
+    warmup=settings.CROWD_ANOMALY_WARMUP_READINGS,
+    cooldown_seconds=settings.CROWD_ANOMALY_COOLDOWN
+)
@@ -0,0 +1,113 @@
+"""
+Crowd Snapshot Cache
+Serves the latest crowd reading per temple from memory instead of MongoDB
+"""
+import asyncio
+import time
+import logging
+from typing import Dict, Optional
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+class CrowdSnapshot:
+    """Latest crowd reading for one temple together with its version"""
+    
+    __slots__ = ("temple_id", "data", "version", "loaded_at")
+    
+    def __init__(self, temple_id: str, data: Optional[dict], version: int):
+        self.temple_id = temple_id
+        self.data = data
+        self.version = version
+        self.loaded_at = time.monotonic()
+    
+    @property
+    def etag(self) -> str:
+        return f'"{self.temple_id}-{self.version}"'
+
+class CrowdSnapshotCache:
+    """
+    Per-temple write-through cache backed by the crowd_latest collection.
+    
+    The worker that ingests a reading stores it immediately. Other workers
+    revalidate against crowd_latest at most once per max_staleness seconds,
+    so every poll in between is answered from memory.
+    """
+    
+    def __init__(self, max_staleness: float):
+        self.max_staleness = max_staleness
+        self._snapshots: Dict[str, CrowdSnapshot] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+    
+    def put(self, temple_id: str, data: dict, version: int):
+        """Store a freshly written snapshot unless a newer one is cached"""
+        current = self._snapshots.get(temple_id)
+        if current is not None and current.version > version:
+            return
+        self._snapshots[temple_id] = CrowdSnapshot(temple_id, data, version)
+    
+    def peek(self, temple_id: str) -> Optional[CrowdSnapshot]:
+        """Return the cached snapshot without revalidating it"""
+        return self._snapshots.get(temple_id)
+    
+    def _is_fresh(self, snapshot: Optional[CrowdSnapshot]) -> bool:
+        return snapshot is not None and time.monotonic() - snapshot.loaded_at < self.max_staleness
+    
+    async def get(self, temple_id: str, latest_collection, crowd_collection) -> CrowdSnapshot:
+        """Get the snapshot for a temple, loading it from MongoDB if stale"""
+        snapshot = self._snapshots.get(temple_id)
+        if self._is_fresh(snapshot):
+            return snapshot
+        
+        # Only one request per temple goes to the database; the rest wait for it
+        lock = self._locks.setdefault(temple_id, asyncio.Lock())
+        async with lock:
+            snapshot = self._snapshots.get(temple_id)
+            if self._is_fresh(snapshot):
+                return snapshot
+            return await self._load(temple_id, snapshot, latest_collection, crowd_collection)
+    
+    async def _load(self, temple_id: str, snapshot: Optional[CrowdSnapshot], latest_collection, crowd_collection) -> CrowdSnapshot:
+        if snapshot is not None and snapshot.version > 0:
+            # Only transfer the document if another worker wrote a newer version
+            latest = await latest_collection.find_one(
+                {"_id": temple_id, "version": {"$ne": snapshot.version}}
+            )
+            if latest is None:
+                snapshot.loaded_at = time.monotonic()
+                return snapshot
+        else:
+            latest = await latest_collection.find_one({"_id": temple_id})
+        
+        if latest is None:
+            # Cold start against data written before crowd_latest existed
+            latest = await self._seed_from_history(temple_id, latest_collection, crowd_collection)
+        
+        if latest is None:
+            loaded = CrowdSnapshot(temple_id, None, 0)
+        else:
+            loaded = CrowdSnapshot(temple_id, latest["snapshot"], latest["version"])
+        
+        self._snapshots[temple_id] = loaded
+        return loaded
+    
+    async def _seed_from_history(self, temple_id: str, latest_collection, crowd_collection) -> Optional[dict]:
+        crowd_data = await crowd_collection.find_one(
+            {"temple_id": temple_id},
+            sort=[("timestamp", -1)],
+            projection={"_id": 0}
+        )
+        if crowd_data is None:
+            return None
+        
+        await latest_collection.update_one(
+            {"_id": temple_id},
+            {"$setOnInsert": {"snapshot": crowd_data, "version": 1}},
+            upsert=True
+        )
+        logger.info(f"Seeded crowd snapshot cache for {temple_id} from crowd history")
+        return await latest_collection.find_one({"_id": temple_id})
+
+# Global cache instance
+crowd_cache = CrowdSnapshotCache(max_staleness=settings.CROWD_CACHE_MAX_STALENESS)
@@ -0,0 +1,102 @@
+"""
+Crowd Status Classifier
+Derives zone density, status and wait time on ingest from raw counts
+"""
+from bisect import bisect_right
+from typing import List
+import numpy as np
+
+from ..config import settings
+from ..database.mongodb_schemas import CrowdStatus
+from .crowd_zones import MAX_ZONES, TEMPLE_IDS, TEMPLE_INDEX, ZONE_INDEX
+
+STATUS_LEVELS: List[CrowdStatus] = [
+    CrowdStatus.LOW,
+    CrowdStatus.MODERATE,
+    CrowdStatus.HIGH,
+    CrowdStatus.CRITICAL
+]
+
+def status_for_density(density: float) -> CrowdStatus:
+    """Status of a density on its own, without hysteresis, e.g. for an averaged bucket"""
+    thresholds = [settings.CROWD_THRESHOLD_LOW, settings.CROWD_THRESHOLD_MODERATE, settings.CROWD_THRESHOLD_HIGH]
+    return STATUS_LEVELS[bisect_right(thresholds, density)]
+
+class CrowdClassifier:
+    """
+    Classifies zone density against the configured thresholds.
+    
+    Status escalates as soon as a threshold is crossed but only steps down
+    once density falls `hysteresis` points below it, so readings hovering
+    around a threshold do not flap. Wait time follows Little's law,
+    W = L / throughput, using a smoothed observed throughput per zone.
+    """
+    
+    def __init__(self, hysteresis: float, dwell_minutes: float, smoothing: float):
+        self.thresholds = np.array([
+            settings.CROWD_THRESHOLD_LOW,
+            settings.CROWD_THRESHOLD_MODERATE,
+            settings.CROWD_THRESHOLD_HIGH
+        ], dtype=np.float64)
+        self.hysteresis = hysteresis
+        self.dwell_minutes = dwell_minutes
+        self.smoothing = smoothing
+        
+        shape = (len(TEMPLE_IDS), MAX_ZONES)
+        self.level = np.full(shape, -1, dtype=np.int8)  # -1 until first reading
+        self.throughput = np.full(shape, np.nan)  # people per minute
+    
+    def apply(self, crowd_doc: dict):
+        """Fill in derived fields of a crowd document in place"""
+        temple_id = crowd_doc["temple_id"]
+        zones = crowd_doc["zones"]
+        
+        crowd_doc["temple_name"] = crowd_doc.get("temple_name") or settings.TEMPLES[temple_id]["name"]
+        if crowd_doc.get("total_crowd") is None:
+            crowd_doc["total_crowd"] = sum(zone["current_count"] for zone in zones)
+        if not zones:
+            return
+        
+        row = TEMPLE_INDEX[temple_id]
+        cols = np.array([ZONE_INDEX[temple_id][zone["zone_id"]] for zone in zones], dtype=np.intp)
+        counts = np.array([zone["current_count"] for zone in zones], dtype=np.float64)
+        capacity = np.maximum([zone["max_capacity"] for zone in zones], 1).astype(np.float64)
+        
+        # Sensors may send raw counts only; trust a supplied density otherwise
+        supplied = np.array([np.nan if zone.get("density") is None else zone["density"] for zone in zones])
+        density = np.where(np.isnan(supplied), counts / capacity * 100, supplied)
+        
+        # Escalate immediately, de-escalate only once clear of the hysteresis band
+        previous = self.level[row, cols]
+        raw = np.searchsorted(self.thresholds, density, side="right")
+        relaxed = np.searchsorted(self.thresholds, density + self.hysteresis, side="right")
+        level = np.where(raw >= previous, raw, np.minimum(previous, relaxed))
+        self.level[row, cols] = level
+        
+        # Smooth observed throughput, falling back to capacity over the nominal dwell time
+        observed = np.array([
+            np.nan if zone.get("throughput_per_minute") is None else zone["throughput_per_minute"]
+            for zone in zones
+        ])
+        current = self.throughput[row, cols]
+        smoothed = np.where(
+            np.isnan(current), observed, (1 - self.smoothing) * current + self.smoothing * observed
+        )
+        throughput = np.where(np.isnan(observed), current, smoothed)
+        self.throughput[row, cols] = throughput
+        
+        rate = np.where(np.isnan(throughput) | (throughput <= 0), capacity / self.dwell_minutes, throughput)
+        wait = np.ceil(counts / rate).astype(np.int64)
+        
+        for i, zone in enumerate(zones):
+            zone["zone_name"] = zone.get("zone_name") or zone["zone_id"]
+            zone["density"] = round(float(density[i]), 2)
+            zone["status"] = STATUS_LEVELS[level[i]]
+            zone["wait_time_minutes"] = int(wait[i])
+
+# Global classifier instance
+crowd_classifier = CrowdClassifier(
+    hysteresis=settings.CROWD_STATUS_HYSTERESIS,
+    dwell_minutes=settings.CROWD_ZONE_DWELL_MINUTES,
+    smoothing=settings.CROWD_THROUGHPUT_SMOOTHING
+)
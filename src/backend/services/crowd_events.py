@@ -0,0 +1,99 @@
+"""
+Crowd Event Bus
+Pushes crowd snapshots to in-process consumers as they are written
+"""
+import asyncio
+import logging
+from typing import Dict, List, Set
+
+from .crowd_cache import crowd_cache
+
+logger = logging.getLogger(__name__)
+
+class CrowdSubscription:
+    """
+    Pending snapshots for one consumer, at most one per temple.
+    
+    A consumer that falls behind receives only the newest snapshot of each
+    temple, so memory stays bounded and stale states are never replayed.
+    """
+    
+    def __init__(self):
+        self._pending: Dict[str, dict] = {}
+        self._ready = asyncio.Event()
+    
+    def _offer(self, event: dict):
+        self._pending[event["temple_id"]] = event
+        self._ready.set()
+    
+    async def get(self) -> List[dict]:
+        """Wait for snapshots and return everything pending"""
+        await self._ready.wait()
+        self._ready.clear()
+        events = list(self._pending.values())
+        self._pending.clear()
+        return events
+
+class CrowdEventBus:
+    """
+    Fans crowd snapshot events out to subscribers.
+    
+    Snapshots are published by the ingest path of this worker and, when
+    change streams are enabled, by writes from other workers. Snapshot
+    versions from crowd_latest drop duplicates and out-of-order events.
+    """
+    
+    def __init__(self):
+        self._subscribers: Set[CrowdSubscription] = set()
+        self._versions: Dict[str, int] = {}
+    
+    def subscribe(self) -> CrowdSubscription:
+        subscription = CrowdSubscription()
+        self._subscribers.add(subscription)
+        return subscription
+    
+    def unsubscribe(self, subscription: CrowdSubscription):
+        self._subscribers.discard(subscription)
+    
+    def publish(self, temple_id: str, snapshot: dict, version: int, local: bool = True):
+        """Offer a snapshot to subscribers; `local` is False for other workers' writes"""
+        if version <= self._versions.get(temple_id, 0):
+            return
+        self._versions[temple_id] = version
+        
+        event = {"temple_id": temple_id, "version": version, "snapshot": snapshot, "local": local}
+        for subscription in self._subscribers:
+            subscription._offer(event)
+    
+    async def follow_changes(self, latest_collection, retry_interval: float = 5.0):
+        """
+        Publish snapshots written by other workers from a crowd_latest change
+        stream, keeping this worker's snapshot cache current as well.
+        Requires MongoDB running as a replica set.
+        """
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+        resume_token = None
+        
+        while True:
+            try:
+                async with latest_collection.watch(
+                    pipeline, full_document="updateLookup", resume_after=resume_token
+                ) as stream:
+                    logger.info("Following crowd_latest change stream")
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        doc = change.get("fullDocument")
+                        if not doc or "snapshot" not in doc:
+                            continue
+                        crowd_cache.put(doc["_id"], doc["snapshot"], doc["version"])
+                        self.publish(doc["_id"], doc["snapshot"], doc["version"], local=False)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The driver resumes transient failures itself; start afresh otherwise
+                logger.error(f"Crowd change stream failed, retrying: {e}")
+                resume_token = None
+                await asyncio.sleep(retry_interval)
+
+# Global event bus instance
+crowd_event_bus = CrowdEventBus()
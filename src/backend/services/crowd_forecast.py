@@ -0,0 +1,123 @@
+"""
+Short-term Crowd Forecasting
+Holt (level + trend) exponential smoothing per zone, held in NumPy arrays
+"""
+from datetime import datetime, timedelta
+from typing import List
+import numpy as np
+
+from ..config import settings
+from .crowd_rollups import EPOCH
+from .crowd_zones import MAX_ZONES, TEMPLE_IDS, TEMPLE_INDEX, ZONE_INDEX
+
+# Two-sided 95% normal quantile for confidence bands
+BAND_Z = 1.96
+
+class CrowdForecaster:
+    """
+    Time-aware Holt smoothing over a (temples x zones) grid.
+    
+    Readings arrive at irregular intervals, so the smoothing factors are
+    derived from the elapsed time and the configured time constants. Each
+    ingest touches only its temple's row; forecasts for every temple are
+    produced in one vectorised expression.
+    """
+    
+    def __init__(self, level_minutes: float, trend_minutes: float):
+        self.level_minutes = level_minutes
+        self.trend_minutes = trend_minutes
+        
+        shape = (len(TEMPLE_IDS), MAX_ZONES)
+        self.level = np.zeros(shape)
+        self.trend = np.zeros(shape)  # density points per minute
+        self.residual_var = np.zeros(shape)
+        self.last_seen = np.full(shape, np.nan)  # minutes since epoch
+    
+    def update(self, temple_id: str, zones: List[dict], timestamp: datetime):
+        """Fold one reading for a temple into the smoothing state"""
+        row = TEMPLE_INDEX[temple_id]
+        cols = np.array([ZONE_INDEX[temple_id][zone["zone_id"]] for zone in zones], dtype=np.intp)
+        y = np.array([zone["density"] for zone in zones], dtype=np.float64)
+        now = (timestamp - EPOCH).total_seconds() / 60
+        
+        last_seen = self.last_seen[row, cols]
+        fresh = np.isnan(last_seen)
+        
+        # Ignore out-of-order readings rather than running the state backwards
+        dt = np.where(fresh, 0.0, now - last_seen)
+        valid = fresh | (dt > 0)
+        cols, y, dt, fresh = cols[valid], y[valid], dt[valid], fresh[valid]
+        if cols.size == 0:
+            return
+        
+        level = self.level[row, cols]
+        trend = self.trend[row, cols]
+        
+        alpha = 1 - np.exp(-dt / self.level_minutes)
+        beta = 1 - np.exp(-dt / self.trend_minutes)
+        
+        predicted = level + trend * dt
+        residual = y - predicted
+        new_level = predicted + alpha * residual
+        with np.errstate(invalid="ignore", divide="ignore"):
+            slope = np.where(dt > 0, (new_level - level) / dt, 0.0)
+        new_trend = beta * slope + (1 - beta) * trend
+        
+        self.residual_var[row, cols] = np.where(
+            fresh, 0.0, (1 - alpha) * self.residual_var[row, cols] + alpha * residual ** 2
+        )
+        self.level[row, cols] = np.where(fresh, y, new_level)
+        self.trend[row, cols] = np.where(fresh, 0.0, new_trend)
+        self.last_seen[row, cols] = now
+    
+    def forecast_all(self, horizons: np.ndarray):
+        """
+        Forecast every zone of every temple at the given horizons (minutes).
+        
+        Returns (point, lower, upper) arrays of shape (temples, zones, horizons).
+        """
+        h = horizons[None, None, :]
+        point = self.level[..., None] + self.trend[..., None] * h
+        
+        # Residual spread widens with the horizon relative to the level's memory
+        spread = BAND_Z * np.sqrt(self.residual_var[..., None] * (1 + h / self.level_minutes))
+        
+        return (
+            np.clip(point, 0, 100),
+            np.clip(point - spread, 0, 100),
+            np.clip(point + spread, 0, 100)
+        )
+    
+    def forecast(self, temple_id: str, horizons: List[int]) -> List[dict]:
+        """Forecast a temple's zones with confidence bands"""
+        point, lower, upper = self.forecast_all(np.asarray(horizons, dtype=np.float64))
+        row = TEMPLE_INDEX[temple_id]
+        
+        forecasts = []
+        for zone_id, col in ZONE_INDEX[temple_id].items():
+            if np.isnan(self.last_seen[row, col]):
+                continue
+            
+            forecasts.append({
+                "zone_id": zone_id,
+                "current_level": float(self.level[row, col]),
+                "trend_per_minute": float(self.trend[row, col]),
+                "last_updated": EPOCH + timedelta(minutes=float(self.last_seen[row, col])),
+                "forecasts": [
+                    {
+                        "minutes": minutes,
+                        "density": float(point[row, col, i]),
+                        "lower": float(lower[row, col, i]),
+                        "upper": float(upper[row, col, i])
+                    }
+                    for i, minutes in enumerate(horizons)
+                ]
+            })
+        
+        return forecasts
+
+# Global forecaster instance
+crowd_forecaster = CrowdForecaster(
+    level_minutes=settings.CROWD_FORECAST_LEVEL_MINUTES,
+    trend_minutes=settings.CROWD_FORECAST_TREND_MINUTES
+)
@@ -0,0 +1,115 @@
+"""
+Crowd History Streaming
+Async record iterators, NDJSON encoding and per-zone downsampling for crowd history
+"""
+import json
+from array import array
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import AsyncIterator, Dict, Tuple
+import numpy as np
+
+from ..config import settings
+from .crowd_rollups import EPOCH, rollup_zone_data
+from .downsampling import lttb
+
+async def iter_raw_history(cursor) -> AsyncIterator[dict]:
+    """Yield raw crowd readings as they arrive from the cursor"""
+    async for record in cursor:
+        yield record
+
+def raw_zone_projection(zone: str) -> dict:
+    """Projection that returns only the timestamp and the matching zone element"""
+    return {"_id": 0, "timestamp": 1, "zones": {"$elemMatch": {"zone_id": zone}}}
+
+async def iter_raw_zone_history(cursor) -> AsyncIterator[dict]:
+    """Yield zone-filtered history from documents read with raw_zone_projection"""
+    async for record in cursor:
+        yield {"timestamp": record["timestamp"], "zone_data": record["zones"][0]}
+
+async def iter_rollup_history(cursor, temple_id: str, resolution: str) -> AsyncIterator[dict]:
+    """Group rollup documents sorted by bucket into crowd history records"""
+    current = None
+    
+    async for rollup in cursor:
+        if current is not None and current["timestamp"] != rollup["bucket_start"]:
+            yield current
+            current = None
+        
+        if current is None:
+            current = {
+                "temple_id": temple_id,
+                "temple_name": settings.TEMPLES[temple_id]["name"],
+                "resolution": resolution,
+                "timestamp": rollup["bucket_start"],
+                "zones": [],
+                "total_crowd": 0
+            }
+        
+        zone_data = rollup_zone_data(rollup)
+        current["zones"].append(zone_data)
+        current["total_crowd"] += zone_data["current_count"]
+    
+    if current is not None:
+        yield current
+
+async def iter_rollup_zone_history(cursor) -> AsyncIterator[dict]:
+    """Yield single-zone rollup documents shaped like zone-filtered history"""
+    async for rollup in cursor:
+        yield {"timestamp": rollup["bucket_start"], "zone_data": rollup_zone_data(rollup)}
+
+async def downsample_history(records: AsyncIterator[dict], max_points: int) -> AsyncIterator[dict]:
+    """
+    Reduce every zone's series to at most max_points with LTTB.
+    
+    Only timestamps, densities and counts are kept while reading, in compact
+    arrays, so memory stays a few bytes per reading regardless of window.
+    Output is grouped by zone, each series in time order.
+    """
+    series: Dict[str, Tuple[array, array, array]] = {}
+    
+    async for record in records:
+        seconds = (record["timestamp"] - EPOCH).total_seconds()
+        zones = [record["zone_data"]] if "zone_data" in record else record.get("zones", [])
+        
+        for zone in zones:
+            timestamps, densities, counts = series.setdefault(
+                zone["zone_id"], (array("d"), array("d"), array("d"))
+            )
+            timestamps.append(seconds)
+            densities.append(zone["density"])
+            counts.append(zone["current_count"])
+    
+    for zone_id, (timestamps, densities, counts) in series.items():
+        x = np.frombuffer(timestamps, dtype=np.float64)
+        y = np.frombuffer(densities, dtype=np.float64)
+        
+        for i in lttb(x, y, max_points):
+            yield {
+                "timestamp": EPOCH + timedelta(seconds=timestamps[i]),
+                "zone_data": {
+                    "zone_id": zone_id,
+                    "density": densities[i],
+                    "current_count": counts[i]
+                }
+            }
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+async def iter_ndjson(records: AsyncIterator[dict], chunk_size: int = 500) -> AsyncIterator[bytes]:
+    """Encode records as newline-delimited JSON, flushing every chunk_size records"""
+    lines = []
+    
+    async for record in records:
+        lines.append(json.dumps(record, default=_json_default))
+        if len(lines) >= chunk_size:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+    
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
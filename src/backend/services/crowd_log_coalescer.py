@@ -0,0 +1,100 @@
+"""
+Crowd Event Coalescer
+Turns per-reading zone statuses into transition and periodic summary events
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from ..config import settings
+from ..database.mongodb_schemas import CrowdStatus
+
+CONGESTED = {CrowdStatus.HIGH, CrowdStatus.CRITICAL}
+
+class _ZoneEpisode:
+    __slots__ = ("status", "readings", "density_sum", "density_max", "summary_due")
+    
+    def __init__(self):
+        self.status: Optional[CrowdStatus] = None
+        self.readings = 0
+        self.density_sum = 0.0
+        self.density_max = 0.0
+        self.summary_due: Optional[datetime] = None
+
+class CrowdLogCoalescer:
+    """
+    Logs a zone when it enters, changes within or leaves a congested status,
+    plus a summary every summary_interval while it stays congested, instead
+    of one event per reading.
+    """
+    
+    def __init__(self, summary_interval: timedelta):
+        self.summary_interval = summary_interval
+        self._zones: Dict[Tuple[str, str], _ZoneEpisode] = {}
+    
+    def observe(self, crowd_doc: dict) -> List[dict]:
+        """Return the event log documents one crowd reading gives rise to"""
+        events = []
+        temple_id = crowd_doc["temple_id"]
+        timestamp = crowd_doc["timestamp"]
+        
+        for zone in crowd_doc["zones"]:
+            episode = self._zones.setdefault((temple_id, zone["zone_id"]), _ZoneEpisode())
+            status = CrowdStatus(zone["status"])
+            density = zone["density"]
+            previous = episode.status
+            
+            if status != previous and (status in CONGESTED or previous in CONGESTED):
+                events.append({
+                    "event_type": "crowd_update",
+                    "temple_id": temple_id,
+                    "message": f"{zone['zone_name']} now at {status.value} density: {density:.1f}%",
+                    "metadata": {
+                        "zone": zone["zone_id"],
+                        "density": density,
+                        "from_status": previous.value if previous else None,
+                        "to_status": status.value
+                    },
+                    "timestamp": timestamp
+                })
+                episode.readings = 0
+                episode.density_sum = 0.0
+                episode.density_max = 0.0
+                episode.summary_due = timestamp + self.summary_interval
+            
+            episode.status = status
+            
+            if status not in CONGESTED:
+                continue
+            
+            episode.readings += 1
+            episode.density_sum += density
+            episode.density_max = max(episode.density_max, density)
+            
+            if timestamp >= episode.summary_due:
+                events.append({
+                    "event_type": "crowd_update",
+                    "temple_id": temple_id,
+                    "message": (
+                        f"{zone['zone_name']} still at {status.value} density: "
+                        f"avg {episode.density_sum / episode.readings:.1f}%, peak {episode.density_max:.1f}%"
+                    ),
+                    "metadata": {
+                        "zone": zone["zone_id"],
+                        "status": status.value,
+                        "readings": episode.readings,
+                        "average_density": episode.density_sum / episode.readings,
+                        "peak_density": episode.density_max
+                    },
+                    "timestamp": timestamp
+                })
+                episode.readings = 0
+                episode.density_sum = 0.0
+                episode.density_max = 0.0
+                episode.summary_due = timestamp + self.summary_interval
+        
+        return events
+
+# Global coalescer instance
+crowd_log_coalescer = CrowdLogCoalescer(
+    summary_interval=timedelta(seconds=settings.CROWD_LOG_SUMMARY_INTERVAL)
+)
@@ -0,0 +1,162 @@
+"""
+Crowd Prediction Engine
+Seasonal day-of-week x hour x zone crowd profiles built from hourly rollups
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from ..config import settings
+from .crowd_rollups import ROLLUP_RESOLUTIONS, bucket_start
+from .crowd_zones import ZONE_INDEX
+
+logger = logging.getLogger(__name__)
+
+HOUR = ROLLUP_RESOLUTIONS["1h"]
+
+class CrowdPredictionEngine:
+    """
+    Keeps, for every temple, the sum of hourly mean densities and the number
+    of weeks observed per (day of week, hour, zone) over a sliding window.
+    
+    The window advances once per completed hour. Hours entering the window
+    are read from the hourly rollups once `grace` has passed, so late
+    readings near the boundary are included. The value each hour added is
+    remembered and subtracted exactly when the hour leaves the window, so
+    rollups changing after they were folded in cannot skew the profile.
+    """
+    
+    def __init__(self, weeks: int, grace: timedelta, refresh_interval: float = 60.0):
+        self.weeks = weeks
+        self.grace = grace
+        self.refresh_interval = refresh_interval
+        self.zone_index: Dict[str, Dict[str, int]] = ZONE_INDEX
+        self.density_sum: Dict[str, np.ndarray] = {}
+        self.samples: Dict[str, np.ndarray] = {}
+        self.covered_until: Optional[datetime] = None
+        self._contributions: Dict[datetime, List[Tuple[str, tuple, float]]] = {}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._reset()
+    
+    def _reset(self):
+        for temple_id, zones in self.zone_index.items():
+            self.density_sum[temple_id] = np.zeros((7, 24, len(zones)))
+            self.samples[temple_id] = np.zeros((7, 24, len(zones)), dtype=np.int32)
+        self._contributions.clear()
+    
+    async def refresh(self, rollups_collection, now: Optional[datetime] = None):
+        """Fold every hour completed (plus grace) since the last refresh into the profiles"""
+        until = bucket_start((now or datetime.utcnow()) - self.grace, HOUR)
+        if self.covered_until == until:
+            return
+        
+        async with self._lock:
+            if self.covered_until == until:
+                return
+            
+            window = timedelta(weeks=self.weeks)
+            
+            if self.covered_until is None or until - self.covered_until >= window:
+                self._reset()
+                start = until - window
+            else:
+                start = self.covered_until
+                # Hours leaving the window take back exactly what they added
+                for hour_start in [hour for hour in self._contributions if hour < until - window]:
+                    for temple_id, cell, density in self._contributions.pop(hour_start):
+                        self.density_sum[temple_id][cell] -= density
+                        self.samples[temple_id][cell] -= 1
+                        if self.samples[temple_id][cell] == 0:
+                            # Drop accumulated rounding error with the last sample
+                            self.density_sum[temple_id][cell] = 0.0
+            
+            query = {"resolution": "1h", "bucket_start": {"$gte": start, "$lt": until}}
+            projection = {"_id": 0, "temple_id": 1, "zone_id": 1, "bucket_start": 1, "density_sum": 1, "readings": 1}
+            
+            async for rollup in rollups_collection.find(query, projection=projection):
+                zone = self.zone_index.get(rollup["temple_id"], {}).get(rollup["zone_id"])
+                if zone is None:
+                    continue
+                
+                hour_start = rollup["bucket_start"]
+                cell = (hour_start.weekday(), hour_start.hour, zone)
+                density = rollup["density_sum"] / rollup["readings"]
+                
+                self.density_sum[rollup["temple_id"]][cell] += density
+                self.samples[rollup["temple_id"]][cell] += 1
+                self._contributions.setdefault(hour_start, []).append((rollup["temple_id"], cell, density))
+            
+            self.covered_until = until
+            logger.debug(f"Crowd prediction profiles refreshed up to {until.isoformat()}")
+    
+    async def _run(self, rollups_collection):
+        while True:
+            try:
+                await self.refresh(rollups_collection)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Crowd prediction refresh failed: {e}")
+            await asyncio.sleep(self.refresh_interval)
+    
+    def start(self, rollups_collection):
+        """Keep the profiles current in the background, independent of requests"""
+        self._task = asyncio.create_task(self._run(rollups_collection))
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    def baseline(self, temple_id: str, timestamp: datetime) -> np.ndarray:
+        """Expected density per zone for the weekday and hour of timestamp, NaN if unknown"""
+        cell = (timestamp.weekday(), timestamp.hour)
+        samples = self.samples[temple_id][cell]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(samples > 0, self.density_sum[temple_id][cell] / samples, np.nan)
+    
+    def predict(self, temple_id: str, start: datetime, hours: int) -> List[dict]:
+        """Predict zone densities for each of the next `hours` hours from start"""
+        density_sum = self.density_sum[temple_id]
+        samples = self.samples[temple_id]
+        
+        # Mean over observed weeks, NaN where a cell has no history
+        with np.errstate(invalid="ignore", divide="ignore"):
+            profile = np.where(samples > 0, density_sum / samples, np.nan)
+        
+        predictions = []
+        for offset in range(hours):
+            target = start + timedelta(hours=offset)
+            day_of_week, hour = target.weekday(), target.hour
+            
+            zone_predictions = {}
+            for zone_id, i in self.zone_index[temple_id].items():
+                weeks = int(samples[day_of_week, hour, i])
+                if weeks > 0:
+                    zone_predictions[zone_id] = {
+                        "predicted_density": float(profile[day_of_week, hour, i]),
+                        "confidence": "high" if weeks >= 3 else "medium"
+                    }
+            
+            predictions.append({
+                "day_of_week": day_of_week,
+                "hour": hour,
+                "zone_predictions": zone_predictions,
+                "based_on_weeks": int(samples[day_of_week, hour].max(initial=0))
+            })
+        
+        return predictions
+
+# Global prediction engine instance
+prediction_engine = CrowdPredictionEngine(
+    weeks=settings.CROWD_PREDICTION_WEEKS,
+    grace=timedelta(minutes=settings.CROWD_PREDICTION_GRACE_MINUTES),
+    refresh_interval=settings.CROWD_PREDICTION_REFRESH_INTERVAL
+)
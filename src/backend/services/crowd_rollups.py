@@ -0,0 +1,227 @@
+"""
+Crowd Rollups
+Incrementally maintained per-zone aggregates of crowd readings
+"""
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+from pymongo import UpdateOne
+
+from ..config import settings
+from .crowd_classifier import status_for_density
+
+EPOCH = datetime(1970, 1, 1)
+
+# Rollup resolutions and their bucket width in seconds, finest first
+ROLLUP_RESOLUTIONS: Dict[str, int] = {
+    "1m": 60,
+    "5m": 5 * 60,
+    "1h": 60 * 60,
+    "1d": 24 * 60 * 60,
+}
+
+def retention_seconds(resolution: Optional[str]) -> int:
+    """How long a tier is kept; None is the raw crowd_data collection"""
+    if resolution is None:
+        return settings.CROWD_RAW_RETENTION_DAYS * 24 * 60 * 60
+    return settings.CROWD_ROLLUP_RETENTION_DAYS[resolution] * 24 * 60 * 60
+
+def utc_naive(timestamp: datetime) -> datetime:
+    """Normalise a timestamp to naive UTC, the form MongoDB returns"""
+    if timestamp.tzinfo is not None:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+def bucket_start(timestamp: datetime, seconds: int) -> datetime:
+    """Truncate a timestamp to the start of its rollup bucket"""
+    elapsed = int((utc_naive(timestamp) - EPOCH).total_seconds())
+    return EPOCH + timedelta(seconds=elapsed - elapsed % seconds)
+
+def build_rollup_updates(crowd_doc: dict) -> List[UpdateOne]:
+    """Build the upserts that fold one crowd reading into every rollup"""
+    updates = []
+    timestamp = crowd_doc["timestamp"]
+    
+    for resolution, seconds in ROLLUP_RESOLUTIONS.items():
+        start = bucket_start(timestamp, seconds)
+        expires_at = start + timedelta(seconds=seconds + retention_seconds(resolution))
+        
+        for zone in crowd_doc.get("zones", []):
+            density = zone["density"]
+            count = zone["current_count"]
+            wait = zone.get("wait_time_minutes") or 0
+            
+            updates.append(UpdateOne(
+                {
+                    "temple_id": crowd_doc["temple_id"],
+                    "resolution": resolution,
+                    "bucket_start": start,
+                    "zone_id": zone["zone_id"]
+                },
+                {
+                    "$setOnInsert": {"expires_at": expires_at},
+                    "$set": {"zone_name": zone.get("zone_name") or zone["zone_id"]},
+                    "$inc": {"readings": 1, "density_sum": density, "count_sum": count, "wait_sum": wait},
+                    "$min": {"density_min": density, "count_min": count},
+                    "$max": {
+                        "density_max": density,
+                        "count_max": count,
+                        "max_capacity": zone["max_capacity"],
+                        "last_updated": timestamp
+                    }
+                },
+                upsert=True
+            ))
+    
+    return updates
+
+# $dateTrunc unit and bin size of each tier, aligned like bucket_start
+ROLLUP_DATE_TRUNC = {
+    "1m": ("minute", 1),
+    "5m": ("minute", 5),
+    "1h": ("hour", 1),
+    "1d": ("day", 1),
+}
+
+def backfill_pipeline(resolution: str, start: datetime, end: datetime) -> List[dict]:
+    """
+    Aggregate raw readings in [start, end) into one tier's rollups and merge
+    them into crowd_rollups, replacing buckets that already exist. start and
+    end must fall on bucket boundaries so every bucket is rebuilt whole.
+    """
+    seconds = ROLLUP_RESOLUTIONS[resolution]
+    unit, bin_size = ROLLUP_DATE_TRUNC[resolution]
+    
+    return [
+        {"$match": {"timestamp": {"$gte": start, "$lt": end}}},
+        {"$sort": {"timestamp": 1}},
+        {"$unwind": "$zones"},
+        {"$group": {
+            "_id": {
+                "temple_id": "$temple_id",
+                "zone_id": "$zones.zone_id",
+                "bucket_start": {"$dateTrunc": {"date": "$timestamp", "unit": unit, "binSize": bin_size}}
+            },
+            "zone_name": {"$last": {"$ifNull": ["$zones.zone_name", "$zones.zone_id"]}},
+            "readings": {"$sum": 1},
+            "density_sum": {"$sum": "$zones.density"},
+            "count_sum": {"$sum": "$zones.current_count"},
+            "wait_sum": {"$sum": {"$ifNull": ["$zones.wait_time_minutes", 0]}},
+            "density_min": {"$min": "$zones.density"},
+            "count_min": {"$min": "$zones.current_count"},
+            "density_max": {"$max": "$zones.density"},
+            "count_max": {"$max": "$zones.current_count"},
+            "max_capacity": {"$max": "$zones.max_capacity"},
+            "last_updated": {"$max": "$timestamp"}
+        }},
+        {"$project": {
+            "_id": 0,
+            "temple_id": "$_id.temple_id",
+            "resolution": {"$literal": resolution},
+            "bucket_start": "$_id.bucket_start",
+            "zone_id": "$_id.zone_id",
+            "expires_at": {"$add": ["$_id.bucket_start", (seconds + retention_seconds(resolution)) * 1000]},
+            "zone_name": 1, "readings": 1, "density_sum": 1, "count_sum": 1, "wait_sum": 1,
+            "density_min": 1, "count_min": 1, "density_max": 1, "count_max": 1,
+            "max_capacity": 1, "last_updated": 1
+        }},
+        {"$merge": {
+            "into": "crowd_rollups",
+            "on": ["temple_id", "resolution", "bucket_start", "zone_id"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert"
+        }}
+    ]
+
+async def backfill_rollups(crowd_collection, now: Optional[datetime] = None) -> Dict[str, tuple]:
+    """
+    Rebuild every tier from the raw readings still stored.
+    
+    Only buckets wholly covered by raw data and already finished are
+    rebuilt: older buckets would lose history the raw collection no longer
+    holds, and the current bucket is still being folded into on ingest.
+    Safe to run repeatedly. Returns the rebuilt range per tier.
+    """
+    oldest = await crowd_collection.find_one({}, projection={"timestamp": 1}, sort=[("timestamp", 1)])
+    if oldest is None:
+        return {}
+    
+    now = utc_naive(now or datetime.utcnow())
+    rebuilt = {}
+    for resolution, seconds in ROLLUP_RESOLUTIONS.items():
+        start = bucket_start(oldest["timestamp"], seconds)
+        if start < oldest["timestamp"]:
+            start += timedelta(seconds=seconds)
+        end = bucket_start(now, seconds)
+        if start >= end:
+            continue
+        
+        await crowd_collection.aggregate(backfill_pipeline(resolution, start, end)).to_list(length=None)
+        rebuilt[resolution] = (start, end)
+    
+    return rebuilt
+
+def rollups_to_heatmap(rollups: Iterable[dict]) -> Dict[int, Dict[str, dict]]:
+    """Shape hourly rollup documents into the hour -> zone heatmap structure"""
+    heatmap = {}
+    
+    for rollup in rollups:
+        readings = rollup["readings"]
+        heatmap.setdefault(rollup["bucket_start"].hour, {})[rollup["zone_id"]] = {
+            "average_density": rollup["density_sum"] / readings,
+            "average_count": rollup["count_sum"] / readings,
+            "min_density": rollup["density_min"],
+            "max_density": rollup["density_max"],
+            "min_count": rollup["count_min"],
+            "max_count": rollup["count_max"],
+            "readings_count": readings
+        }
+    
+    return heatmap
+
+def select_history_resolution(hours: int, max_points: int) -> Optional[str]:
+    """
+    Pick the finest tier whose retention covers the window and whose point
+    count fits the budget. None means raw readings are detailed enough.
+    """
+    window = hours * 60 * 60
+    
+    if window <= retention_seconds(None) and window / settings.CROWD_UPDATE_INTERVAL <= max_points:
+        return None
+    
+    for resolution, seconds in ROLLUP_RESOLUTIONS.items():
+        if window <= retention_seconds(resolution) and window / seconds <= max_points:
+            return resolution
+    
+    return list(ROLLUP_RESOLUTIONS)[-1]
+
+def rollup_zone_data(rollup: dict) -> dict:
+    """
+    Shape one rollup document like a zone entry of a crowd reading, so
+    clients see the same fields whichever tier served the history.
+    Status is derived from the bucket's mean density.
+    """
+    readings = rollup["readings"]
+    density = rollup["density_sum"] / readings
+    count = rollup["count_sum"] / readings
+    
+    # Rollups written before capacity and wait were folded in fall back to estimates
+    max_capacity = rollup.get("max_capacity") or (round(count * 100 / density) if density else 0)
+    if "wait_sum" in rollup:
+        wait_time = round(rollup["wait_sum"] / readings)
+    else:
+        wait_time = math.ceil(density / 100 * settings.CROWD_ZONE_DWELL_MINUTES)
+    
+    return {
+        "zone_id": rollup["zone_id"],
+        "zone_name": rollup.get("zone_name") or rollup["zone_id"],
+        "density": round(density, 2),
+        "current_count": round(count),
+        "max_capacity": max_capacity,
+        "wait_time_minutes": wait_time,
+        "status": status_for_density(density),
+        "last_updated": rollup.get("last_updated") or rollup["bucket_start"],
+        "min_density": rollup["density_min"],
+        "max_density": rollup["density_max"],
+        "readings_count": readings
+    }
@@ -0,0 +1,118 @@
+"""
+Rolling Crowd Statistics
+Fixed-size NumPy ring buffers of recent readings per temple and zone
+"""
+import warnings
+from datetime import datetime
+from typing import Dict, List
+import numpy as np
+
+from ..config import settings
+from .crowd_rollups import EPOCH, utc_naive
+from .crowd_zones import MAX_ZONES, TEMPLE_IDS, TEMPLE_INDEX, ZONE_INDEX
+
+# Rolling windows reported by the stats endpoint, in minutes
+STATS_WINDOWS: Dict[str, int] = {"5m": 5, "15m": 15, "60m": 60}
+
+# Window used for rate of change and time-to-capacity
+RATE_WINDOW_MINUTES = 5
+
+def _minutes(timestamp: datetime) -> float:
+    return (utc_naive(timestamp) - EPOCH).total_seconds() / 60
+
+class CrowdRingBuffer:
+    """
+    Last `size` readings of every zone in (temples x zones x size) arrays.
+    
+    Memory is allocated once and never grows; old readings are overwritten
+    in place. Statistics are computed with masked reductions over a
+    temple's row, so a query costs the same whatever the traffic.
+    """
+    
+    def __init__(self, size: int):
+        self.size = size
+        shape = (len(TEMPLE_IDS), MAX_ZONES, size)
+        self.times = np.full(shape, np.nan)  # minutes since epoch
+        self.density = np.zeros(shape, dtype=np.float32)
+        self.head = np.zeros(shape[:2], dtype=np.intp)
+    
+    def append(self, temple_id: str, zones: List[dict], timestamp: datetime):
+        """Record one reading for each zone of a temple"""
+        row = TEMPLE_INDEX[temple_id]
+        cols = np.array([ZONE_INDEX[temple_id][zone["zone_id"]] for zone in zones], dtype=np.intp)
+        positions = self.head[row, cols]
+        
+        self.times[row, cols, positions] = _minutes(timestamp)
+        self.density[row, cols, positions] = [zone["density"] for zone in zones]
+        self.head[row, cols] = (positions + 1) % self.size
+    
+    def stats(self, temple_id: str, now: datetime) -> List[dict]:
+        """Rolling mean, p95, rate of change and time-to-capacity per zone"""
+        row = TEMPLE_INDEX[temple_id]
+        zones = ZONE_INDEX[temple_id]
+        n_zones = len(zones)
+        
+        times = self.times[row, :n_zones]
+        density = self.density[row, :n_zones].astype(np.float64)
+        age = _minutes(now) - times
+        
+        # Most recent reading per zone
+        last = (self.head[row, :n_zones] - 1) % self.size
+        latest = density[np.arange(n_zones), last]
+        has_data = ~np.isnan(times[np.arange(n_zones), last])
+        
+        windows = {}
+        rows = np.arange(n_zones)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            for name, minutes in STATS_WINDOWS.items():
+                mask = age <= minutes  # NaN ages compare False
+                count = mask.sum(axis=1)
+                mean = np.where(mask, density, 0.0).sum(axis=1) / count
+                
+                # Nearest-rank p95: masked-out readings sort last as +inf
+                ranked = np.sort(np.where(mask, density, np.inf), axis=1)
+                rank = np.maximum(np.ceil(0.95 * count).astype(np.intp) - 1, 0)
+                p95 = np.where(count > 0, ranked[rows, rank], np.nan)
+                
+                windows[name] = (mean, p95, count)
+            
+            # Least-squares slope over the rate window, in density points per minute
+            mask = age <= RATE_WINDOW_MINUTES
+            n = mask.sum(axis=1)
+            t = np.where(mask, times, 0.0)
+            y = np.where(mask, density, 0.0)
+            t_mean = t.sum(axis=1) / n
+            y_mean = y.sum(axis=1) / n
+            cov = (np.where(mask, (times - t_mean[:, None]) * (density - y_mean[:, None]), 0.0)).sum(axis=1)
+            var = (np.where(mask, (times - t_mean[:, None]) ** 2, 0.0)).sum(axis=1)
+            rate = np.where((n >= 2) & (var > 0), cov / var, np.nan)
+            minutes_to_capacity = np.where(rate > 0, (100 - latest) / rate, np.nan)
+        
+        def _value(x):
+            return None if np.isnan(x) else float(x)
+        
+        stats = []
+        for zone_id, i in zones.items():
+            if not has_data[i]:
+                continue
+            
+            stats.append({
+                "zone_id": zone_id,
+                "latest_density": float(latest[i]),
+                "windows": {
+                    name: {
+                        "mean_density": _value(mean[i]),
+                        "p95_density": _value(p95[i]),
+                        "readings": int(count[i])
+                    }
+                    for name, (mean, p95, count) in windows.items()
+                },
+                "rate_per_minute": _value(rate[i]),
+                "minutes_to_capacity": _value(max(minutes_to_capacity[i], 0.0))
+            })
+        
+        return stats
+
+# Global ring buffer instance
+crowd_ring_buffer = CrowdRingBuffer(size=settings.CROWD_STATS_BUFFER_SIZE)
@@ -0,0 +1,25 @@
+"""
+Crowd Zone Layout
+Fixed temple and zone positions shared by the array-backed crowd analytics
+"""
+from typing import Dict, FrozenSet, List
+
+from ..config import settings
+
+TEMPLE_IDS: List[str] = list(settings.TEMPLES.keys())
+
+# Row of each temple in (temples x zones) state arrays
+TEMPLE_INDEX: Dict[str, int] = {temple_id: i for i, temple_id in enumerate(TEMPLE_IDS)}
+
+# Column of each zone within its temple's row
+ZONE_INDEX: Dict[str, Dict[str, int]] = {
+    temple_id: {zone: i for i, zone in enumerate(info["zones"])}
+    for temple_id, info in settings.TEMPLES.items()
+}
+
+MAX_ZONES: int = max(len(zones) for zones in ZONE_INDEX.values())
+
+# Valid zones per temple for ingest validation
+ZONE_SETS: Dict[str, FrozenSet[str]] = {
+    temple_id: frozenset(zones) for temple_id, zones in ZONE_INDEX.items()
+}
@@ -0,0 +1,41 @@
+"""
+Time Series Downsampling
+Shape-preserving point reduction for charting long crowd histories
+"""
+import numpy as np
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    
+    Returns the indices of at most `threshold` points that keep the visual
+    shape of the series, always including the first and last point.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    
+    # threshold - 2 buckets over the interior points, plus a final bucket holding the last point
+    edges = np.append(np.linspace(1, n - 1, threshold - 1).astype(np.int64), n)
+    
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2]
+        
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        
+        # Pick the point forming the largest triangle with the previous pick and the next bucket's mean
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(areas.argmax())
+        indices[i + 1] = a
+    
+    return indices
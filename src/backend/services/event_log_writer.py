@@ -0,0 +1,91 @@
+"""
+Event Log Writer
+Buffers event log documents and writes them in batches off the request path
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Optional
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+class EventLogWriter:
+    """
+    Collects event documents in memory and flushes them with insert_many.
+    
+    A flush happens every flush_interval seconds, or sooner once batch_size
+    documents are waiting. When the buffer is full the oldest entries are
+    dropped so a slow database never grows memory without bound.
+    """
+    
+    def __init__(self, flush_interval: float, batch_size: int, max_buffer: int):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self.dropped = 0
+        self._buffer: Deque[dict] = deque(maxlen=max_buffer)
+        self._collection = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def enqueue(self, event: dict):
+        """Queue an event document without waiting for the database"""
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+        
+        # A full deque discards its oldest entry
+        self._buffer.append(event)
+        
+        if self._wakeup is not None and len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+    
+    async def flush(self):
+        """Write every buffered event in one insert_many"""
+        if not self._buffer or self._collection is None:
+            return
+        
+        batch = list(self._buffer)
+        self._buffer.clear()
+        try:
+            await self._collection.insert_many(batch, ordered=False)
+        except Exception as e:
+            logger.error(f"Error writing {len(batch)} event logs: {e}")
+    
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+    
+    def start(self, collection):
+        """Start the background flush loop"""
+        self._collection = collection
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Event log writer started")
+    
+    async def stop(self):
+        """Stop the flush loop and write whatever is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        
+        await self.flush()
+        if self.dropped:
+            logger.warning(f"Event log writer dropped {self.dropped} events under backpressure")
+
+# Global event log writer instance
+event_log_writer = EventLogWriter(
+    flush_interval=settings.EVENT_LOG_FLUSH_INTERVAL,
+    batch_size=settings.EVENT_LOG_BATCH_SIZE,
+    max_buffer=settings.EVENT_LOG_MAX_BUFFER
+)
@@ -0,0 +1,176 @@
+"""
+ID Generator
+Snowflake-style IDs: time-sortable and unique across workers with leased worker ids
+"""
+import asyncio
+import logging
+import os
+import random
+import secrets
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from pymongo.errors import DuplicateKeyError
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# 41 bits of milliseconds since ID_EPOCH_MS, 10 bits of worker id, 12 bits of sequence
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+# 2024-01-01T00:00:00Z
+ID_EPOCH_MS = 1704067200000
+
+# 63-bit IDs fit in 19 decimal digits; padding keeps string order equal to time order
+ID_DIGITS = 19
+
+class IdGenerator:
+    """
+    Generates 63-bit integer IDs from a millisecond timestamp, worker id and
+    per-millisecond sequence, rendered as a prefix plus zero-padded digits.
+    
+    Up to 4096 IDs per millisecond per worker; beyond that, or if the clock
+    steps backwards, generation waits for the next millisecond.
+    
+    The worker id is either fixed (ID_WORKER_ID) or leased from MongoDB by
+    start(). A lease is renewed in the background and IDs are refused once
+    it lapses locally. Another process may only take over a lapsed id a
+    further lease period after its expiry, so the two never issue together.
+    """
+    
+    def __init__(self, worker_id: Optional[int] = None, lease_seconds: float = 60.0):
+        if worker_id is not None and not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"Worker id must be between 0 and {MAX_WORKER_ID}")
+        self.lease_seconds = lease_seconds
+        self._worker_id = worker_id
+        self._fixed = worker_id is not None
+        self._owner = secrets.token_hex(8)
+        self._lease_pid: Optional[int] = None
+        self._lease_deadline = 0.0  # time.monotonic() until which a leased id may be used
+        self._last_ms = -1
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def worker_id(self) -> int:
+        if self._fixed:
+            return self._worker_id
+        # A forked child does not inherit its parent's lease
+        if self._worker_id is None or self._lease_pid != os.getpid():
+            raise RuntimeError("No worker id: set ID_WORKER_ID or lease one with start()")
+        if time.monotonic() > self._lease_deadline:
+            raise RuntimeError(f"Lease on worker id {self._worker_id} has lapsed")
+        return self._worker_id
+    
+    # Leasing
+    
+    async def _acquire(self, leases) -> int:
+        """Lease the first free worker id, scanning from a random offset"""
+        ttl = timedelta(seconds=self.lease_seconds)
+        offset = random.randrange(MAX_WORKER_ID + 1)
+        
+        for i in range(MAX_WORKER_ID + 1):
+            candidate = (offset + i) % (MAX_WORKER_ID + 1)
+            requested = time.monotonic()
+            now = datetime.utcnow()
+            try:
+                # Matches a lease lapsed for a full period, or inserts a new one;
+                # a live lease makes the insert fail on _id
+                await leases.update_one(
+                    {"_id": candidate, "expires_at": {"$lt": now - ttl}},
+                    {"$set": {
+                        "owner": self._owner,
+                        "host": socket.gethostname(),
+                        "pid": os.getpid(),
+                        "expires_at": now + ttl
+                    }},
+                    upsert=True
+                )
+            except DuplicateKeyError:
+                continue
+            
+            with self._lock:
+                self._worker_id = candidate
+                self._lease_pid = os.getpid()
+                self._lease_deadline = requested + self.lease_seconds
+                self._last_ms = -1
+            logger.info(f"Leased ID worker id {candidate}")
+            return candidate
+        
+        raise RuntimeError(f"All {MAX_WORKER_ID + 1} ID worker ids are leased")
+    
+    async def _renew(self, leases):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            requested = time.monotonic()
+            try:
+                result = await leases.update_one(
+                    {"_id": self._worker_id, "owner": self._owner},
+                    {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}}
+                )
+                if result.matched_count:
+                    self._lease_deadline = requested + self.lease_seconds
+                else:
+                    logger.error(f"Lost lease on ID worker id {self._worker_id}, leasing another")
+                    await self._acquire(leases)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Could not renew ID worker id lease: {e}")
+    
+    async def start(self, leases):
+        """Lease a worker id unless one is configured, and keep renewing it"""
+        if self._fixed:
+            logger.info(f"Using configured ID worker id {self._worker_id}")
+            return
+        await self._acquire(leases)
+        self._task = asyncio.create_task(self._renew(leases))
+    
+    async def stop(self):
+        # The lease is left to expire rather than handed straight to another process
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    def next_int(self) -> int:
+        with self._lock:
+            worker_id = self.worker_id
+            now_ms = time.time_ns() // 1_000_000 - ID_EPOCH_MS
+            
+            if now_ms < self._last_ms:
+                # Clock stepped back; keep issuing from the last millisecond
+                now_ms = self._last_ms
+            
+            if now_ms == self._last_ms:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    while now_ms <= self._last_ms:
+                        now_ms = time.time_ns() // 1_000_000 - ID_EPOCH_MS
+            else:
+                self._sequence = 0
+            
+            self._last_ms = now_ms
+            return (now_ms << (WORKER_BITS + SEQUENCE_BITS)) | (worker_id << SEQUENCE_BITS) | self._sequence
+    
+    def next_id(self, prefix: str) -> str:
+        """Next ID with a human-readable prefix, e.g. BK0000412387191668736"""
+        return f"{prefix}{self.next_int():0{ID_DIGITS}d}"
+
+def id_timestamp_ms(generated_id: str) -> int:
+    """Unix time in milliseconds at which an ID was generated"""
+    value = int(generated_id[-ID_DIGITS:])
+    return (value >> (WORKER_BITS + SEQUENCE_BITS)) + ID_EPOCH_MS
+
+# Global generator instance
+id_generator = IdGenerator(settings.ID_WORKER_ID, settings.ID_WORKER_LEASE_SECONDS)
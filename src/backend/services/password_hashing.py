@@ -0,0 +1,68 @@
+"""
+Password Hashing
+Runs bcrypt hashing and verification on a bounded executor off the event loop
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from passlib.context import CryptContext
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many password operations are already queued"""
+
+class PasswordHasher:
+    """
+    bcrypt on a dedicated thread pool.
+    
+    bcrypt releases the GIL while hashing, so threads give real parallelism
+    and the event loop stays free. At most `max_pending` operations may be
+    running or queued; beyond that callers fail fast instead of waiting
+    behind a login storm.
+    """
+    
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self.context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        self._executor: Optional[ThreadPoolExecutor] = None
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+    
+    async def _run(self, func, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHasherBusy()
+        
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.pending -= 1
+    
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(self.context.verify, plain_password, hashed_password)
+    
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+    
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self.rejected:
+            logger.warning(f"Password hasher rejected {self.rejected} operations under overload")
+
+# Global password hasher instance
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_PENDING)
@@ -0,0 +1,182 @@
+"""
+QR Code Rendering
+Runs CPU-bound QR matrix building and PNG encoding off the event loop
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import qrcode
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+def render_qr_png(qr_data: str) -> bytes:
+    """Encode `qr_data` as a PNG image"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=settings.QR_CODE_SIZE // 30,
+        border=settings.QR_CODE_BORDER,
+    )
+    qr.add_data(qr_data)
+    qr.make(fit=True)
+    
+    img = qr.make_image(fill_color="black", back_color="white")
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+class QRRenderer:
+    """
+    Bounded worker pool for QR rendering.
+    
+    qrcode is pure Python, so a process pool is the default; threads still
+    keep the loop responsive but share the GIL with request handling.
+    """
+    
+    def __init__(self, workers: int, executor: str = "process"):
+        self.workers = workers
+        self.executor_kind = executor
+        self._executor: Optional[Executor] = None
+    
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="qr")
+            else:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            logger.info(f"QR rendering on {self.workers} {self.executor_kind} workers")
+        return self._executor
+    
+    async def render(self, qr_data: str) -> bytes:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), render_qr_png, qr_data)
+    
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Global renderer instance
+qr_renderer = QRRenderer(settings.QR_CODE_WORKERS, settings.QR_CODE_EXECUTOR)
+
+class QRImageStore:
+    """
+    Content-addressed disk cache of rendered QR images.
+    
+    Images are keyed by a hash of the encoded data and rendering settings,
+    so a file never changes once written and the hash doubles as its ETag.
+    Any image can be rendered again, so pruning removes files older than
+    max_age and then the oldest ones until the cache fits max_bytes.
+    """
+    
+    def __init__(self, path: str, renderer: QRRenderer, max_age: float, max_bytes: int,
+                 prune_interval: float = 3600.0):
+        self.path = Path(path)
+        self.renderer = renderer
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.prune_interval = prune_interval
+        self._task: Optional[asyncio.Task] = None
+    
+    @staticmethod
+    def digest(qr_data: str) -> str:
+        key = f"{settings.QR_CODE_SIZE}:{settings.QR_CODE_BORDER}:{qr_data}"
+        return hashlib.sha256(key.encode()).hexdigest()[:32]
+    
+    def _file(self, digest: str) -> Path:
+        return self.path / digest[:2] / f"{digest}.png"
+    
+    @staticmethod
+    def _read(file: Path) -> Optional[bytes]:
+        try:
+            return file.read_bytes()
+        except FileNotFoundError:
+            return None
+    
+    @staticmethod
+    def _write(file: Path, png: bytes):
+        file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = file.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_bytes(png)
+        os.replace(tmp, file)
+    
+    async def get_png(self, qr_data: str) -> bytes:
+        """PNG for `qr_data`, rendered and stored on first use"""
+        file = self._file(self.digest(qr_data))
+        png = await asyncio.to_thread(self._read, file)
+        if png is not None:
+            return png
+        
+        png = await self.renderer.render(qr_data)
+        try:
+            await asyncio.to_thread(self._write, file, png)
+        except OSError as e:
+            logger.warning(f"Could not cache QR image {file}: {e}")
+        return png
+    
+    def prune(self) -> int:
+        """Remove expired images, then the oldest beyond max_bytes; returns files removed"""
+        files = []
+        for file in self.path.glob("*/*.png"):
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, file))
+        files.sort()
+        
+        cutoff = time.time() - self.max_age
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for mtime, size, file in files:
+            if mtime >= cutoff and total <= self.max_bytes:
+                break
+            try:
+                file.unlink()
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        return removed
+    
+    async def _run(self):
+        while True:
+            try:
+                removed = await asyncio.to_thread(self.prune)
+                if removed:
+                    logger.info(f"Pruned {removed} cached QR images")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"QR image cache pruning failed: {e}")
+            await asyncio.sleep(self.prune_interval)
+    
+    def start(self):
+        """Prune the cache periodically in the background"""
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+# Global image store
+qr_image_store = QRImageStore(
+    settings.QR_CODE_STORAGE_PATH,
+    qr_renderer,
+    max_age=settings.QR_CODE_CACHE_MAX_AGE_DAYS * 24 * 60 * 60,
+    max_bytes=settings.QR_CODE_CACHE_MAX_MB * 1024 * 1024
+)
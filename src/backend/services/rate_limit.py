@@ -0,0 +1,85 @@
+"""
+Rate Limit Stores
+Token buckets with per-minute and per-hour limits, in memory or on Redis
+"""
+import logging
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+class InMemoryRateLimitStore:
+    """
+    Token buckets for one process.
+    
+    Each key holds a per-minute and a per-hour bucket that refill
+    continuously; a request needs a token from both. At most `max_keys`
+    keys are kept, dropping the oldest first.
+    """
+    
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, List[float]] = {}
+    
+    async def hit(self, key: str, per_minute: int, per_hour: int, now: float) -> Tuple[bool, float]:
+        """Take a token for `key`; returns (allowed, seconds until retry)"""
+        state = self._buckets.get(key)
+        if state is None:
+            if len(self._buckets) >= self.max_keys:
+                del self._buckets[next(iter(self._buckets))]
+            state = self._buckets[key] = [per_minute, per_hour, now]
+        else:
+            elapsed = now - state[2]
+            state[0] = min(per_minute, state[0] + elapsed * per_minute / 60)
+            state[1] = min(per_hour, state[1] + elapsed * per_hour / 3600)
+            state[2] = now
+        
+        if state[0] >= 1 and state[1] >= 1:
+            state[0] -= 1
+            state[1] -= 1
+            return True, 0.0
+        
+        wait = 0.0
+        if state[0] < 1:
+            wait = (1 - state[0]) * 60 / per_minute
+        if state[1] < 1:
+            wait = max(wait, (1 - state[1]) * 3600 / per_hour)
+        return False, wait
+
+# Same token buckets, updated atomically on the Redis server
+TOKEN_BUCKET_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'm', 'h', 't')
+local per_minute = tonumber(ARGV[1])
+local per_hour = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local m = tonumber(state[1]) or per_minute
+local h = tonumber(state[2]) or per_hour
+local elapsed = math.max(0, now - (tonumber(state[3]) or now))
+m = math.min(per_minute, m + elapsed * per_minute / 60)
+h = math.min(per_hour, h + elapsed * per_hour / 3600)
+local wait = 0
+if m < 1 then wait = (1 - m) * 60 / per_minute end
+if h < 1 then wait = math.max(wait, (1 - h) * 3600 / per_hour) end
+if wait == 0 then
+    m = m - 1
+    h = h - 1
+end
+redis.call('HSET', KEYS[1], 'm', m, 'h', h, 't', now)
+redis.call('EXPIRE', KEYS[1], 3600)
+return tostring(wait)
+"""
+
+class RedisRateLimitStore:
+    """
+    Token buckets shared by every worker, one script call per request.
+    
+    Works with any client exposing register_script, including a local
+    stand-in such as fakeredis for tests.
+    """
+    
+    def __init__(self, client, prefix: str = "pw:rl:"):
+        self.prefix = prefix
+        self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+    
+    async def hit(self, key: str, per_minute: int, per_hour: int, now: float) -> Tuple[bool, float]:
+        wait = float(await self._script(keys=[self.prefix + key], args=[per_minute, per_hour, now]))
+        return wait == 0, wait
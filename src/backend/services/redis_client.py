@@ -0,0 +1,47 @@
+"""
+Redis Connection
+Shared optional Redis client for cross-worker coordination
+"""
+import logging
+from typing import Optional
+
+from ..config import settings
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # Redis is optional; features fall back to per-process state
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+_client = None
+
+async def get_redis() -> Optional["redis.Redis"]:
+    """Connected Redis client, or None when Redis is disabled or unreachable"""
+    global _client
+    
+    if not settings.REDIS_ENABLED:
+        return None
+    
+    if redis is None:
+        logger.warning("REDIS_ENABLED is set but the redis package is not installed")
+        return None
+    
+    if _client is None:
+        client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+        try:
+            await client.ping()
+        except Exception as e:
+            logger.error(f"Could not connect to Redis at {settings.REDIS_URL}: {e}")
+            await client.aclose()
+            return None
+        _client = client
+        logger.info("Connected to Redis")
+    
+    return _client
+
+async def close_redis():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
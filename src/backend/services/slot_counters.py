@@ -0,0 +1,244 @@
+"""
+Booking Slot Counters
+Atomic per temple/date/slot capacity reservation
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from pymongo.errors import DuplicateKeyError
+
+from ..config import settings
+from ..database.mongodb_schemas import BookingStatus
+
+logger = logging.getLogger(__name__)
+
+# Booking statuses that hold places in a slot
+HOLDING_STATUSES = [BookingStatus.CONFIRMED, BookingStatus.PENDING, BookingStatus.COMPLETED]
+
+def slot_capacity(temple_id: str) -> int:
+    """Number of pilgrims a single time slot admits"""
+    return settings.TEMPLES[temple_id].get("slot_capacity", settings.BOOKING_SLOT_CAPACITY)
+
+def day_start(value: datetime) -> datetime:
+    """UTC midnight of a booking date, naive as MongoDB returns it"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def slot_key(temple_id: str, booking_date: datetime, time_slot: str) -> dict:
+    """
+    Identity of a slot. Capacity is per day, so the date is normalised and
+    bookings made with different time or timezone parts share one counter.
+    """
+    return {"temple_id": temple_id, "booking_date": day_start(booking_date), "time_slot": time_slot}
+
+def _zone_field(zone: str) -> str:
+    # Zone names become field names, which may not contain '.' or start with '$'
+    return zone.replace(".", "_").replace("$", "_")
+
+async def _seed_counter(counters, bookings, key: dict):
+    """Create a missing counter from the bookings already stored for the slot"""
+    day = key["booking_date"]
+    pipeline = [
+        {"$match": {
+            **key,
+            "booking_date": {"$gte": day, "$lt": day + timedelta(days=1)},
+            "status": {"$in": HOLDING_STATUSES}
+        }},
+        {"$group": {"_id": "$zone", "people": {"$sum": "$number_of_people"}}}
+    ]
+    
+    zones = {}
+    async for row in bookings.aggregate(pipeline):
+        zones[_zone_field(row["_id"] or "unknown")] = row["people"]
+    
+    try:
+        await counters.insert_one({**key, "booked": sum(zones.values()), "zones": zones})
+    except DuplicateKeyError:
+        # Another request seeded it first
+        pass
+
+async def reserve_slot(counters, bookings, temple_id: str, booking_date: datetime,
+                       time_slot: str, zone: str, people: int) -> bool:
+    """
+    Reserve places in a slot with one conditional $inc.
+    
+    Returns False if the slot cannot take `people` more pilgrims. The
+    counter is created from existing bookings the first time a slot is used.
+    """
+    capacity = slot_capacity(temple_id)
+    if people > capacity:
+        return False
+    
+    key = slot_key(temple_id, booking_date, time_slot)
+    guarded = {**key, "booked": {"$lte": capacity - people}}
+    increment = {"$inc": {"booked": people, f"zones.{_zone_field(zone)}": people}}
+    
+    result = await counters.update_one(guarded, increment)
+    if result.modified_count:
+        availability_cache.invalidate(temple_id, booking_date)
+        return True
+    
+    # Either the slot is full or its counter does not exist yet
+    if await counters.find_one(key, projection={"_id": 1}) is not None:
+        return False
+    
+    await _seed_counter(counters, bookings, key)
+    result = await counters.update_one(guarded, increment)
+    if result.modified_count:
+        availability_cache.invalidate(temple_id, booking_date)
+        return True
+    return False
+
+async def slot_remaining(counters, bookings, temple_id: str, booking_date: datetime, time_slot: str) -> int:
+    """Places left in a slot, read from its counter rather than the availability cache"""
+    key = slot_key(temple_id, booking_date, time_slot)
+    counter = await counters.find_one(key, projection={"booked": 1})
+    if counter is None:
+        await _seed_counter(counters, bookings, key)
+        counter = await counters.find_one(key, projection={"booked": 1})
+    return max(slot_capacity(temple_id) - counter["booked"], 0)
+
+async def release_slot(counters, temple_id: str, booking_date: datetime,
+                       time_slot: str, zone: str, people: int):
+    """Return places to a slot after a cancellation or failed booking"""
+    result = await counters.update_one(
+        {**slot_key(temple_id, booking_date, time_slot), "booked": {"$gte": people}},
+        {"$inc": {"booked": -people, f"zones.{_zone_field(zone)}": -people}}
+    )
+    availability_cache.invalidate(temple_id, booking_date)
+    if not result.modified_count:
+        logger.warning(f"Slot counter for {temple_id} {booking_date} {time_slot} was missing or below {people}")
+
+
+async def reserve_slots(counters, bookings, reservations: List[tuple]) -> Optional[tuple]:
+    """
+    Reserve several (temple_id, booking_date, time_slot, zone, people) entries, all or nothing.
+    
+    Returns None if every entry was reserved, otherwise the first entry that
+    did not fit after releasing the places taken for the others.
+    """
+    merged: Dict[tuple, int] = {}
+    for temple_id, booking_date, time_slot, zone, people in reservations:
+        key = (temple_id, day_start(booking_date), time_slot, zone)
+        merged[key] = merged.get(key, 0) + people
+    entries = [(*key, people) for key, people in merged.items()]
+    
+    outcomes = await asyncio.gather(
+        *(reserve_slot(counters, bookings, *entry) for entry in entries),
+        return_exceptions=True
+    )
+    failed = [entry for entry, outcome in zip(entries, outcomes) if outcome is not True]
+    if not failed:
+        return None
+    
+    await release_slots(counters, [entry for entry, outcome in zip(entries, outcomes) if outcome is True])
+    
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException):
+            raise outcome
+    return failed[0]
+
+async def release_slots(counters, reservations: List[tuple]):
+    """Release (temple_id, booking_date, time_slot, zone, people) entries"""
+    await asyncio.gather(*(release_slot(counters, *entry) for entry in reservations))
+
+class AvailabilityCache:
+    """Booked places per slot for each temple/day, kept for a short TTL"""
+    
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[tuple, tuple] = {}
+    
+    def get(self, temple_id: str, day: datetime) -> Optional[Dict[str, int]]:
+        entry = self._entries.get((temple_id, day_start(day)))
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+    
+    def put(self, temple_id: str, day: datetime, usage: Dict[str, int]):
+        self._entries[(temple_id, day_start(day))] = (time.monotonic() + self.ttl, usage)
+    
+    def invalidate(self, temple_id: str, booking_date: datetime):
+        self._entries.pop((temple_id, day_start(booking_date)), None)
+
+availability_cache = AvailabilityCache(settings.BOOKING_AVAILABILITY_CACHE_TTL)
+
+async def _load_usage(counters, bookings, temple_id: str, start: datetime, end: datetime) -> Dict[datetime, Dict[str, int]]:
+    """
+    Booked places per day and slot in [start, end).
+    
+    Counters and stored bookings are read concurrently; bookings only
+    fill in slots whose counter has not been created yet.
+    """
+    date_range = {"$gte": start, "$lt": end}
+    pipeline = [
+        {"$match": {"temple_id": temple_id, "booking_date": date_range, "status": {"$in": HOLDING_STATUSES}}},
+        {"$group": {
+            "_id": {"booking_date": "$booking_date", "time_slot": "$time_slot"},
+            "people": {"$sum": "$number_of_people"}
+        }}
+    ]
+    
+    async def read_counters():
+        cursor = counters.find(
+            {"temple_id": temple_id, "booking_date": date_range},
+            projection={"_id": 0, "booking_date": 1, "time_slot": 1, "booked": 1}
+        )
+        return await cursor.to_list(length=None)
+    
+    counter_docs, booking_groups = await asyncio.gather(
+        read_counters(),
+        bookings.aggregate(pipeline).to_list(length=None)
+    )
+    
+    usage: Dict[datetime, Dict[str, int]] = {}
+    counted = set()
+    for doc in counter_docs:
+        day = day_start(doc["booking_date"])
+        slots = usage.setdefault(day, {})
+        slots[doc["time_slot"]] = slots.get(doc["time_slot"], 0) + doc["booked"]
+        counted.add((day, doc["time_slot"]))
+    
+    for group in booking_groups:
+        key = group["_id"]
+        day = day_start(key["booking_date"])
+        if (day, key["time_slot"]) in counted:
+            continue
+        slots = usage.setdefault(day, {})
+        slots[key["time_slot"]] = slots.get(key["time_slot"], 0) + group["people"]
+    
+    return usage
+
+async def slot_availability(counters, bookings, temple_id: str, start: datetime, days: int = 1) -> List[dict]:
+    """Availability of every time slot for `days` consecutive days from `start`"""
+    first_day = day_start(start)
+    day_list = [first_day + timedelta(days=i) for i in range(days)]
+    
+    usage = {day: availability_cache.get(temple_id, day) for day in day_list}
+    missing = [day for day, slots in usage.items() if slots is None]
+    
+    if missing:
+        loaded = await _load_usage(counters, bookings, temple_id, missing[0], missing[-1] + timedelta(days=1))
+        for day in missing:
+            usage[day] = loaded.get(day, {})
+            availability_cache.put(temple_id, day, usage[day])
+    
+    capacity = slot_capacity(temple_id)
+    calendar = []
+    for day in day_list:
+        slots = []
+        for slot in settings.BOOKING_TIME_SLOTS:
+            booked = usage[day].get(slot, 0)
+            slots.append({
+                "time_slot": slot,
+                "available": booked < capacity,
+                "booked": booked,
+                "remaining": max(capacity - booked, 0),
+                "capacity": capacity
+            })
+        calendar.append({"date": day, "slots": slots})
+    
+    return calendar
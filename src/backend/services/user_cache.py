@@ -0,0 +1,98 @@
+"""
+User Cache
+Bounded TTL/LRU cache of active user records for request authentication
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from ..config import settings
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+class UserCache:
+    """
+    Active user records keyed by user id.
+    
+    Entries expire after `ttl` seconds and the least recently used entry is
+    evicted beyond `max_size`. Invalidations are published on Redis, when
+    enabled, so every worker drops its copy; the TTL bounds staleness
+    otherwise.
+    """
+    
+    def __init__(self, max_size: int, ttl: float, channel: str):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.channel = channel
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+    
+    def get(self, user_id: str) -> Optional[dict]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] <= time.monotonic():
+            self.misses += 1
+            return None
+        
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        # Handlers get their own copy of the record
+        return dict(entry[1])
+    
+    def put(self, user_id: str, user: dict):
+        self._entries[user_id] = (time.monotonic() + self.ttl, dict(user))
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def discard(self, user_id: str):
+        """Drop a user from this worker only"""
+        self._entries.pop(user_id, None)
+    
+    async def invalidate(self, user_id: str):
+        """Drop a user from every worker's cache"""
+        self.discard(user_id)
+        
+        client = await get_redis()
+        if client is not None:
+            try:
+                await client.publish(self.channel, user_id)
+            except Exception as e:
+                logger.error(f"Failed to publish user cache invalidation: {e}")
+    
+    async def _listen(self, client):
+        pubsub = client.pubsub()
+        await pubsub.subscribe(self.channel)
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    self.discard(message["data"])
+        finally:
+            await pubsub.aclose()
+    
+    async def start(self):
+        """Follow invalidations from other workers when Redis is enabled"""
+        client = await get_redis()
+        if client is not None:
+            self._task = asyncio.create_task(self._listen(client))
+            logger.info("User cache following Redis invalidations")
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+# Global user cache instance
+user_cache = UserCache(
+    settings.USER_CACHE_SIZE,
+    settings.USER_CACHE_TTL,
+    settings.USER_CACHE_INVALIDATION_CHANNEL
+)
@@ -0,0 +1,399 @@
+"""
+Virtual Waiting Room
+Admission control in front of booking creation when slot windows open, in memory or on Redis
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import math
+import secrets
+import time
+from collections import deque
+from typing import Deque, Optional, Set, Tuple
+
+from ..config import settings
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+class InMemoryWaitingRoomBackend:
+    """
+    Queue state for one process.
+    
+    Tickets are consecutive integers, so the queue is two counters: the
+    last ticket issued and the last ticket admitted. Position is their
+    difference and no per-ticket state is kept until a ticket is used.
+    """
+    
+    def __init__(self):
+        # Tokens from a previous process are not honoured
+        self.room_id = secrets.token_hex(4)
+        self.issued = 0
+        self.admitted_through = 0
+        self.expired_through = 0
+        self._admitted_at: Deque[Tuple[float, int]] = deque()
+        self._consumed: Set[int] = set()
+    
+    async def issue(self) -> int:
+        self.issued += 1
+        return self.issued
+    
+    async def counters(self) -> Tuple[int, int, int]:
+        """(last issued, last admitted, last expired) ticket numbers"""
+        return self.issued, self.admitted_through, self.expired_through
+    
+    async def advance(self, count: int, now: float) -> int:
+        """Admit up to `count` more tickets, returning how many were admitted"""
+        admitted = min(count, self.issued - self.admitted_through)
+        if admitted > 0:
+            self.admitted_through += admitted
+            self._admitted_at.append((now, self.admitted_through))
+        return max(admitted, 0)
+    
+    async def expire(self, before: float):
+        """Expire admissions granted before `before`"""
+        expired_through = self.expired_through
+        while self._admitted_at and self._admitted_at[0][0] <= before:
+            _, expired_through = self._admitted_at.popleft()
+        
+        if expired_through != self.expired_through:
+            self.expired_through = expired_through
+            self._consumed = {ticket for ticket in self._consumed if ticket > expired_through}
+    
+    async def consume(self, ticket: int) -> bool:
+        if ticket in self._consumed:
+            return False
+        self._consumed.add(ticket)
+        return True
+    
+    async def release(self, ticket: int):
+        self._consumed.discard(ticket)
+    
+    async def lead(self, owner: str, lease_seconds: float) -> bool:
+        """Whether `owner` runs the scheduler; one process always does"""
+        return True
+    
+    async def publish_rate(self, rate: float):
+        pass
+    
+    async def shared_rate(self) -> Optional[float]:
+        return None
+
+# Admit up to ARGV[1] tickets, recording when the new last ticket was admitted
+ADVANCE_SCRIPT = """
+local issued = tonumber(redis.call('GET', KEYS[1]) or '0')
+local admitted = tonumber(redis.call('GET', KEYS[2]) or '0')
+local count = math.min(tonumber(ARGV[1]), issued - admitted)
+if count <= 0 then
+    return 0
+end
+admitted = redis.call('INCRBY', KEYS[2], count)
+redis.call('RPUSH', KEYS[3], ARGV[2] .. ':' .. admitted)
+return count
+"""
+
+# Drop admission records at or before ARGV[1] and move the expiry counter past them
+EXPIRE_SCRIPT = """
+local before = tonumber(ARGV[1])
+local through = false
+while true do
+    local head = redis.call('LINDEX', KEYS[1], 0)
+    if not head then
+        break
+    end
+    local sep = string.find(head, ':', 1, true)
+    if tonumber(string.sub(head, 1, sep - 1)) > before then
+        break
+    end
+    through = string.sub(head, sep + 1)
+    redis.call('LPOP', KEYS[1])
+end
+if through then
+    redis.call('SET', KEYS[2], through)
+end
+return through
+"""
+
+# Take or extend the scheduler lease if it is free or already ours
+LEAD_SCRIPT = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return 1
+end
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+class RedisWaitingRoomBackend:
+    """
+    Queue state shared by every worker.
+    
+    The counters are Redis integers, so tickets are issued with INCR and
+    admitted by one script call. Used tickets are keys that expire with
+    their admission. A lease picks the one worker that runs the scheduler,
+    so the admission rate holds however many workers there are.
+    
+    Works with any client exposing register_script, including a local
+    stand-in such as fakeredis for tests.
+    """
+    
+    def __init__(self, client, admission_ttl: float, prefix: str = "pw:wr:"):
+        self.client = client
+        self.admission_ttl = admission_ttl
+        self.prefix = prefix
+        self.room_id: Optional[str] = None
+        self._issued = prefix + "issued"
+        self._admitted = prefix + "admitted"
+        self._expired = prefix + "expired"
+        self._admitted_at = prefix + "admitted_at"
+        self._advance = client.register_script(ADVANCE_SCRIPT)
+        self._expire = client.register_script(EXPIRE_SCRIPT)
+        self._lead = client.register_script(LEAD_SCRIPT)
+    
+    async def connect(self):
+        """Join the shared room, creating it if no worker has yet"""
+        await self.client.set(self.prefix + "room", secrets.token_hex(4), nx=True)
+        self.room_id = await self.client.get(self.prefix + "room")
+    
+    async def issue(self) -> int:
+        return int(await self.client.incr(self._issued))
+    
+    async def counters(self) -> Tuple[int, int, int]:
+        values = await self.client.mget(self._issued, self._admitted, self._expired)
+        return tuple(int(value or 0) for value in values)
+    
+    async def advance(self, count: int, now: float) -> int:
+        return int(await self._advance(keys=[self._issued, self._admitted, self._admitted_at], args=[count, now]))
+    
+    async def expire(self, before: float):
+        await self._expire(keys=[self._admitted_at, self._expired], args=[before])
+    
+    async def consume(self, ticket: int) -> bool:
+        # Outlives the admission, after which the ticket is refused anyway
+        ttl = max(1, math.ceil(self.admission_ttl * 2))
+        return bool(await self.client.set(f"{self.prefix}used:{ticket}", 1, nx=True, ex=ttl))
+    
+    async def release(self, ticket: int):
+        await self.client.delete(f"{self.prefix}used:{ticket}")
+    
+    async def lead(self, owner: str, lease_seconds: float) -> bool:
+        return bool(await self._lead(keys=[self.prefix + "scheduler"], args=[owner, int(lease_seconds * 1000)]))
+    
+    async def publish_rate(self, rate: float):
+        await self.client.set(self.prefix + "rate", rate)
+    
+    async def shared_rate(self) -> Optional[float]:
+        rate = await self.client.get(self.prefix + "rate")
+        return float(rate) if rate is not None else None
+
+class WaitingRoom:
+    """
+    Admits queued clients to booking creation at a controlled rate.
+    
+    Clients join and receive a signed token carrying their ticket number.
+    A scheduler admits tickets in order at `rate` per second. When adaptive,
+    the rate follows measured booking latency and errors: it grows by a
+    fixed step while bookings stay under the latency target and halves
+    when they do not. An admitted ticket may create one booking within
+    admission_ttl seconds.
+    
+    With a shared backend only the worker holding the scheduler lease
+    admits and adapts the rate, from its own share of bookings; the others
+    follow the rate it publishes.
+    """
+    
+    def __init__(self, backend, rate: float, min_rate: float,
+                 max_rate: float, target_latency: float, admission_ttl: float,
+                 tick_interval: float = 0.25, adjust_interval: float = 5.0, adaptive: bool = True):
+        self.backend = backend
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.target_latency = target_latency
+        self.admission_ttl = admission_ttl
+        self.tick_interval = tick_interval
+        self.adjust_interval = adjust_interval
+        self.adaptive = adaptive
+        
+        # Every worker derives the same key, so any of them verifies any token
+        self._key = hmac.new(settings.SECRET_KEY.encode(), b"waiting-room", hashlib.sha256).digest()
+        self._owner = secrets.token_hex(8)
+        self._leading = False
+        self._carry = 0.0
+        self._last_tick: Optional[float] = None
+        self._last_adjust: Optional[float] = None
+        self._latencies = 0.0
+        self._completed = 0
+        self._failed = 0
+        self._task: Optional[asyncio.Task] = None
+    
+    # Tokens
+    
+    def _sign(self, ticket: int) -> str:
+        payload = f"{self.backend.room_id}.{ticket}"
+        signature = hmac.new(self._key, payload.encode(), hashlib.sha256).digest()[:12]
+        return f"{payload}.{base64.urlsafe_b64encode(signature).decode()}"
+    
+    def _ticket(self, token: Optional[str]) -> Optional[int]:
+        parts = (token or "").split(".")
+        if len(parts) != 3 or parts[0] != self.backend.room_id:
+            return None
+        # isdigit alone accepts other scripts' digits such as Arabic-Indic ones
+        if not (parts[1].isascii() and parts[1].isdigit()):
+            return None
+        if not hmac.compare_digest(token.encode(), self._sign(int(parts[1])).encode()):
+            return None
+        return int(parts[1])
+    
+    # Client operations
+    
+    async def join(self) -> dict:
+        ticket = await self.backend.issue()
+        return {"token": self._sign(ticket), **await self._position(ticket)}
+    
+    async def status(self, token: str) -> Optional[dict]:
+        ticket = self._ticket(token)
+        if ticket is None:
+            return None
+        return await self._position(ticket)
+    
+    async def _position(self, ticket: int) -> dict:
+        _, admitted_through, expired_through = await self.backend.counters()
+        ahead = ticket - admitted_through
+        if ahead <= 0:
+            expired = ticket <= expired_through
+            return {"position": 0, "eta_seconds": 0, "admitted": not expired, "expired": expired}
+        return {
+            "position": ahead,
+            "eta_seconds": round(ahead / self.rate, 1),
+            "admitted": False,
+            "expired": False
+        }
+    
+    async def admit(self, token: Optional[str]) -> Optional[int]:
+        """Claim an admitted token for one booking; None if it is not admitted or already used"""
+        ticket = self._ticket(token)
+        if ticket is None:
+            return None
+        _, admitted_through, expired_through = await self.backend.counters()
+        if not expired_through < ticket <= admitted_through:
+            return None
+        if not await self.backend.consume(ticket):
+            return None
+        return ticket
+    
+    async def release(self, ticket: int):
+        """Let an admitted ticket be used again after a rejected booking"""
+        await self.backend.release(ticket)
+    
+    def record_result(self, latency: float, ok: bool):
+        """Feed one booking outcome into the admission rate controller"""
+        self._latencies += latency
+        self._completed += 1
+        if not ok:
+            self._failed += 1
+    
+    # Scheduler
+    
+    async def tick(self, now: float):
+        """Admit tickets for the time elapsed since the last tick"""
+        if self._last_tick is None:
+            self._last_tick = self._last_adjust = now
+        
+        self._leading = await self.backend.lead(self._owner, self.tick_interval * 4)
+        if not self._leading:
+            # Another worker admits; start from now if the lease passes here
+            self._carry = 0.0
+            self._last_tick = self._last_adjust = now
+            self._latencies = 0.0
+            self._completed = 0
+            self._failed = 0
+            self.rate = await self.backend.shared_rate() or self.rate
+            return
+        
+        self._carry += (now - self._last_tick) * self.rate
+        self._last_tick = now
+        self._carry -= await self.backend.advance(int(self._carry), now)
+        issued, admitted_through, _ = await self.backend.counters()
+        if issued == admitted_through:
+            # Unused capacity is not banked while the queue is empty
+            self._carry = min(self._carry, 1.0)
+        await self.backend.expire(now - self.admission_ttl)
+        
+        if self.adaptive and now - self._last_adjust >= self.adjust_interval:
+            self._adjust(issued > admitted_through)
+            self._last_adjust = now
+        await self.backend.publish_rate(self.rate)
+    
+    def _adjust(self, queued: bool):
+        if self._completed:
+            mean_latency = self._latencies / self._completed
+            if self._failed or mean_latency > self.target_latency:
+                self.rate = max(self.min_rate, self.rate / 2)
+            elif queued:
+                self.rate = min(self.max_rate, self.rate + self.min_rate)
+        
+        self._latencies = 0.0
+        self._completed = 0
+        self._failed = 0
+    
+    async def metrics(self) -> dict:
+        issued, admitted_through, expired_through = await self.backend.counters()
+        return {
+            "queue_depth": issued - admitted_through,
+            "admitted_active": admitted_through - expired_through,
+            "issued": issued,
+            "admitted": admitted_through,
+            "admission_rate": round(self.rate, 2),
+            "eta_seconds_for_new": round((issued - admitted_through) / self.rate, 1),
+            "scheduler": self._leading,
+            "recent_bookings": self._completed,
+            "recent_failures": self._failed,
+            "recent_mean_latency": round(self._latencies / self._completed, 3) if self._completed else None
+        }
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            try:
+                # Wall clock, since admission times are shared between workers
+                await self.tick(time.time())
+            except Exception as e:
+                logger.error(f"Waiting room tick failed: {e}")
+    
+    async def start(self):
+        """Share the queue through Redis when available, then start the admission scheduler"""
+        client = await get_redis()
+        if client is not None:
+            backend = RedisWaitingRoomBackend(client, self.admission_ttl)
+            await backend.connect()
+            self.backend = backend
+        else:
+            logger.warning("Waiting room state is per process; run a single worker or enable Redis")
+        
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Waiting room admitting {self.rate} bookings/s")
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+# Global waiting room instance; start() moves it onto Redis when enabled
+waiting_room = WaitingRoom(
+    InMemoryWaitingRoomBackend(),
+    rate=settings.WAITING_ROOM_RATE,
+    min_rate=settings.WAITING_ROOM_MIN_RATE,
+    max_rate=settings.WAITING_ROOM_MAX_RATE,
+    target_latency=settings.WAITING_ROOM_TARGET_LATENCY,
+    admission_ttl=settings.WAITING_ROOM_ADMISSION_TTL,
+    adaptive=settings.WAITING_ROOM_ADAPTIVE
+)
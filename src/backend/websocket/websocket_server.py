@@ -5,24 +5,39 @@ Handles real-time crowd monitoring, shuttle tracking, and emergency alerts
 import asyncio
 import json
 import logging
-from typing import Dict, Set
+from typing import Dict, Optional, Set
 from datetime import datetime
 from fastapi import WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from jose import JWTError, jwt
 import socketio
 
 from ..config import settings
 from ..database.mongodb_connection import (
-    get_crowd_data_collection,
+    get_crowd_latest_collection,
     get_shuttles_collection,
     get_emergencies_collection,
     get_alerts_collection
 )
+from ..services.crowd_events import crowd_event_bus
 
 logger = logging.getLogger(__name__)
 
+def _client_manager() -> Optional[socketio.AsyncManager]:
+    """Relay emits through Redis so clients of every worker receive them"""
+    if not settings.REDIS_ENABLED:
+        return None
+    try:
+        return socketio.AsyncRedisManager(settings.REDIS_URL)
+    except RuntimeError as e:  # Redis client package missing
+        logger.warning(f"Socket.IO emits stay on their own worker: {e}")
+        return None
+
 # Socket.IO server for WebSocket connections
+sio_client_manager = _client_manager()
 sio = socketio.AsyncServer(
     async_mode='asgi',
+    client_manager=sio_client_manager,
     cors_allowed_origins=settings.ALLOWED_ORIGINS,
     ping_timeout=60,
     ping_interval=25
@@ -113,6 +128,16 @@ class ConnectionManager:
 # Global connection manager instance
 manager = ConnectionManager()
 
+def _user_id_from_token(token: Optional[str]) -> Optional[str]:
+    """User id from an API access token, or None if it is invalid"""
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
 # Socket.IO event handlers
 @sio.event
 async def connect(sid, environ):
@@ -130,6 +155,20 @@ async def subscribe(sid, data):
     channel = data.get('channel')
     temple_id = data.get('temple_id')
     
+    if not channel or ':' in channel:
+        await sio.emit('subscription_error', {'channel': channel, 'detail': 'Invalid channel'}, room=sid)
+        return
+    
+    if channel == 'bookings':
+        # Booking updates are private to their user, identified by access token
+        user_id = _user_id_from_token(data.get('token'))
+        if user_id is None:
+            await sio.emit('subscription_error', {'channel': channel, 'detail': 'Invalid token'}, room=sid)
+            return
+        await sio.enter_room(sid, f"bookings:{user_id}")
+        await sio.emit('subscription_confirmed', {'channel': channel}, room=sid)
+        return
+    
     await sio.enter_room(sid, channel)
     if temple_id:
         await sio.enter_room(sid, f"{channel}:{temple_id}")
@@ -155,39 +194,38 @@ async def unsubscribe(sid, data):
 
 # Background tasks for real-time updates
 async def broadcast_crowd_updates():
-    """Broadcast crowd density updates every 5 seconds"""
-    crowd_collection = await get_crowd_data_collection()
+    """Broadcast crowd snapshots as soon as they are ingested"""
+    subscription = crowd_event_bus.subscribe()
     
-    while True:
-        try:
-            # Get latest crowd data for all temples
-            for temple_id in settings.TEMPLES.keys():
-                crowd_data = await crowd_collection.find_one(
-                    {"temple_id": temple_id},
-                    sort=[("timestamp", -1)]
-                )
+    try:
+        while True:
+            for event in await subscription.get():
+                if sio_client_manager is not None and not event["local"]:
+                    # The worker that ingested it already emitted to every client through Redis
+                    continue
                 
-                if crowd_data:
-                    message = {
-                        "type": "crowd_update",
-                        "temple_id": temple_id,
-                        "data": {
-                            "temple_name": crowd_data.get("temple_name"),
-                            "zones": crowd_data.get("zones", []),
-                            "total_crowd": crowd_data.get("total_crowd", 0),
-                            "timestamp": crowd_data.get("timestamp").isoformat()
-                        }
-                    }
-                    
+                temple_id = event["temple_id"]
+                snapshot = event["snapshot"]
+                
+                message = {
+                    "type": "crowd_update",
+                    "temple_id": temple_id,
+                    "data": jsonable_encoder({
+                        "temple_name": snapshot.get("temple_name"),
+                        "zones": snapshot.get("zones", []),
+                        "total_crowd": snapshot.get("total_crowd", 0),
+                        "timestamp": snapshot.get("timestamp")
+                    })
+                }
+                
+                try:
                     # Broadcast via Socket.IO
                     await sio.emit('crowd_update', message, room=f"crowd:{temple_id}")
                     await sio.emit('crowd_update', message, room="crowd")
-            
-            await asyncio.sleep(settings.CROWD_UPDATE_INTERVAL)
-            
-        except Exception as e:
-            logger.error(f"Error broadcasting crowd updates: {e}")
-            await asyncio.sleep(settings.CROWD_UPDATE_INTERVAL)
+                except Exception as e:
+                    logger.error(f"Error broadcasting crowd updates: {e}")
+    finally:
+        crowd_event_bus.unsubscribe(subscription)
 
 async def broadcast_shuttle_updates():
     """Broadcast shuttle location updates every 10 seconds"""
@@ -276,6 +314,17 @@ async def start_background_tasks():
         asyncio.create_task(broadcast_shuttle_updates()),
         asyncio.create_task(broadcast_system_alerts())
     ]
+    
+    if settings.CROWD_CHANGE_STREAMS_ENABLED:
+        # Crowd readings ingested by other workers
+        latest_collection = await get_crowd_latest_collection()
+        tasks.append(asyncio.create_task(crowd_event_bus.follow_changes(latest_collection)))
+    elif sio_client_manager is None:
+        logger.warning(
+            "Socket.IO clients only receive crowd updates ingested by their own worker; "
+            "set REDIS_ENABLED or CROWD_CHANGE_STREAMS_ENABLED when running several workers"
+        )
+    
     logger.info("WebSocket background tasks started")
     return tasks
 
@@ -317,6 +366,32 @@ async def notify_emergency(emergency_data: dict):
     
     logger.info(f"Emergency notification sent for temple {temple_id}")
 
+async def notify_crowd_anomaly(anomaly_data: dict):
+    """Notify crowd subscribers about a detected zone anomaly"""
+    temple_id = anomaly_data.get("temple_id")
+    
+    message = {
+        "type": "crowd_anomaly",
+        "temple_id": temple_id,
+        "data": anomaly_data
+    }
+    
+    await sio.emit('crowd_anomaly', message, room=f"crowd:{temple_id}")
+    await sio.emit('crowd_anomaly', message, room="crowd")
+    
+    logger.info(f"Crowd anomaly notification sent for temple {temple_id}")
+
+async def notify_booking_update(user_id: str, update: dict):
+    """Notify a user's connected clients about a change to their bookings"""
+    message = {
+        "type": "booking_update",
+        "data": update
+    }
+    
+    await sio.emit('booking_update', message, room=f"bookings:{user_id}")
+    
+    logger.info(f"Booking update sent to user {user_id}")
+
 async def notify_alert(alert_data: dict):
     """Notify all connected clients about a new alert"""
     temple_id = alert_data.get("temple_id")